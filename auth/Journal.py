@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Append-only record of the outcome of every uploaded authority record."""
+import json
+import os
+import threading
+
+import importer_utils as utils
+
+
+class Journal(object):
+    """
+    One json line per upload attempt, keyed by id_no.
+
+    A later line for the same id_no supersedes earlier ones, so a
+    record that failed and was then retried ends up as done.
+    """
+
+    DONE = ("created", "updated", "skipped")
+    FAILED = "failed"
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.entries = self.load()
+
+    def load(self):
+        entries = {}
+        if not os.path.exists(self.filename):
+            return entries
+        with open(self.filename) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # last line of a crashed run may be cut off
+                    continue
+                entries[entry["id_no"]] = entry
+        print("Loaded {} journal entries from {}.".format(
+            len(entries), self.filename))
+        return entries
+
+    def record(self, id_no, status, qid=None, reason=None):
+        entry = {"id_no": id_no,
+                 "status": status,
+                 "qid": qid,
+                 "reason": reason,
+                 "timestamp": utils.get_current_timestamp()}
+        line = json.dumps(entry, ensure_ascii=False)
+        with self.lock:
+            with open(self.filename, 'a') as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.entries[id_no] = entry
+
+    def is_done(self, id_no):
+        entry = self.entries.get(id_no)
+        return entry is not None and entry["status"] in self.DONE
+
+    def is_failed(self, id_no):
+        entry = self.entries.get(id_no)
+        return entry is not None and entry["status"] == self.FAILED
+
+    def get_failed_qid(self, id_no):
+        """Get the item created by a failed attempt, if any."""
+        if self.is_failed(id_no):
+            return self.entries[id_no]["qid"]
@@ -3,6 +3,7 @@
 from WikidataItem import WikidataItem
 
 import importer_utils as utils
+from shared import dates
 
 
 class Person(WikidataItem):
@@ -24,27 +25,15 @@ class Person(WikidataItem):
     def set_dates(self):
         date_of_birth = self.raw_data.get("birth")
         if date_of_birth:
-            dob = None
-            dob_pwb = None
-            if "-" in date_of_birth:
-                dob = utils.date_to_dict(date_of_birth, "%Y-%m-%d")
-            elif len(date_of_birth) == 4:
-                dob = utils.date_to_dict(date_of_birth, "%Y")
-            if dob:
-                dob_pwb = self.make_pywikibot_item({"date_value": dob})
-                self.add_statement("dob", dob_pwb)
+            dob = dates.normalise_date(date_of_birth)
+            if dob and "year" in dob:
+                self.add_statement("dob", {"date_value": dob})
 
         date_of_death = self.raw_data.get("death")
         if date_of_death:
-            dod = None
-            dod_pwb = None
-            if "-" in date_of_death:
-                dod = utils.date_to_dict(date_of_death, "%Y-%m-%d")
-            elif len(date_of_death) == 4:
-                dod = utils.date_to_dict(date_of_death, "%Y")
-            if dod:
-                dod_pwb = self.make_pywikibot_item({"date_value": dod})
-                self.add_statement("dod", dod_pwb)
+            dod = dates.normalise_date(date_of_death)
+            if dod and "year" in dod:
+                self.add_statement("dod", {"date_value": dod})
 
     def set_is(self):
         this_is = self.raw_data.get("type")
@@ -73,22 +62,23 @@ class Person(WikidataItem):
     def match_last_name(self):
         l_name = self.raw_data.get("last")
         if l_name:
-            attempt = [x for x in self.last if x["itemLabel"] == l_name]
-            if len(attempt) == 1:
-                self.add_statement(
-                    "last_name", attempt[0]["item"].split("/")[-1])
+            attempt = self.last.get(l_name)
+            if attempt and attempt[1] == 1:
+                self.add_statement("last_name", attempt[0])
 
     def match_first_names(self):
         f_names = self.raw_data.get("first")
         if f_names:
             for f in f_names:
-                attempt = [x for x in self.first if x["itemLabel"] == f]
-                if len(attempt) == 1:
-                    self.add_statement(
-                        "first_name", attempt[0]["item"].split("/")[-1])
+                attempt = self.first.get(f)
+                if attempt and attempt[1] == 1:
+                    self.add_statement("first_name", attempt[0])
 
     def match_wikidata(self):
         attempt = self.existing.get(self.raw_data["id_no"])
+        if not attempt and self.reconciler and \
+                self.raw_data.get("type") == "person":
+            attempt = self.reconciler.match(self.raw_data)
         if attempt:
             self.associate_wd_item(attempt)
 
@@ -100,11 +90,14 @@ class Person(WikidataItem):
                     n = utils.get_rid_of_brackets(n)
                 self.add_label("sv", utils.remove_multiple_spaces(n.strip()))
 
-    def __init__(self, raw_data, repository, data_files, existing):
-        WikidataItem.__init__(self, raw_data, repository, data_files, existing)
+    def __init__(self, raw_data, repository, data_files, existing,
+                 compact=False):
+        WikidataItem.__init__(self, raw_data, repository, data_files,
+                              existing, compact)
         self.first = data_files["first"]
         self.last = data_files["last"]
         self.professions = data_files["professions"]
+        self.reconciler = data_files.get("reconciler")
         self.create_sources()
         self.set_id()
         self.set_is()
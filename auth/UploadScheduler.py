@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""Run several Uploaders at once under a shared, adaptive rate limit."""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import threading
+import time
+
+import pywikibot
+
+MAX_RATE = 2.0
+THROTTLE_CODES = ("maxlag", "ratelimited")
+# raised by pywikibot once its own maxlag and server retries give up
+THROTTLE_ERRORS = tuple(
+    getattr(pywikibot.exceptions, name)
+    for name in ("MaxlagTimeoutError", "TimeoutError", "ServerError")
+    if hasattr(pywikibot.exceptions, name))
+
+
+class RateLimiter(object):
+    """
+    Token bucket whose rate backs off when the wiki asks us to.
+
+    The rate, in edits per second, is halved on every throttle signal
+    and grows back additively for every successful edit, up to
+    max_rate. The cap is kept low by default, the wiki's own limits
+    are what should slow us down, not this ceiling.
+    """
+
+    def __init__(self, rate=0.5, min_rate=0.1, max_rate=MAX_RATE,
+                 step=0.05):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.step = step
+        self.tokens = 1.0
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(1.0, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def acquire(self):
+        """Block until an edit may be made."""
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait_time = (1.0 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+    def slow_down(self, pause=0):
+        """
+        Halve the rate.
+
+        :param pause: seconds no edit at all may be made, e.g. from
+            a Retry-After header
+        """
+        with self.lock:
+            self.refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, -pause * self.rate)
+            pywikibot.output(
+                "Slowing down to {:.2f} edits/s".format(self.rate))
+
+    def speed_up(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.step)
+
+
+def get_status_code(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_throttle_error(error):
+    """Check if an error from a write call means we are editing too fast."""
+    if isinstance(error, THROTTLE_ERRORS):
+        return True
+    if getattr(error, "code", "") in THROTTLE_CODES:
+        return True
+    return get_status_code(error) in (429, 503) or "429" in str(error)
+
+
+def get_retry_after(error):
+    """Get the seconds to wait from the Retry-After header, 0 if none."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return max(float(headers.get("Retry-After", 0)), 0)
+    except ValueError:
+        # a http date, which the API does not send
+        return 0
+
+
+class UploadScheduler(object):
+    """
+    Keep a number of upload jobs in flight at the same time.
+
+    Each job is a callable doing the edits for one item. It is given
+    the edit method of the scheduler and makes every write call
+    through it, so that each edit takes a token from the limiter and
+    an edit hitting maxlag or rate limits is retried on its own, after
+    the limiter has slowed down. A job is never run twice, so an item
+    created by it is not created again.
+    """
+
+    def __init__(self, in_flight=4, limiter=None, max_retries=3,
+                 report_every=100):
+        self.in_flight = in_flight
+        self.limiter = limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.report_every = report_every
+        self.items = 0
+        self.edits = 0
+        self.lock = threading.Lock()
+        self.start = None
+
+    def edit(self, func, *args, **kwargs):
+        """Make one write call under the rate limit."""
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as error:
+                if not is_throttle_error(error) or attempt == self.max_retries:
+                    raise
+                self.limiter.slow_down(get_retry_after(error))
+            else:
+                self.limiter.speed_up()
+                self.count_edit()
+                return result
+
+    def run_job(self, job):
+        result = job(self.edit)
+        with self.lock:
+            self.items += 1
+        return result
+
+    def count_edit(self):
+        with self.lock:
+            self.edits += 1
+            if self.edits % self.report_every == 0:
+                self.report()
+
+    def edits_per_second(self):
+        elapsed = time.monotonic() - self.start
+        return self.edits / elapsed if elapsed else 0.0
+
+    def report(self):
+        pywikibot.output(
+            "Uploaded {} items in {} edits, {:.2f} edits/s".format(
+                self.items, self.edits, self.edits_per_second()))
+
+    def run(self, jobs, on_error=None):
+        """
+        Run all jobs, never more than in_flight at a time.
+
+        :param jobs: iterable of callables, consumed lazily
+        :param on_error: called with the exception of a failed job,
+                         if not given the exception is raised
+        """
+        self.start = time.monotonic()
+        pending = set()
+        with ThreadPoolExecutor(self.in_flight) as executor:
+            for job in jobs:
+                if len(pending) >= self.in_flight:
+                    finished, pending = wait(pending,
+                                             return_when=FIRST_COMPLETED)
+                    self.collect(finished, on_error)
+                pending.add(executor.submit(self.run_job, job))
+            self.collect(wait(pending).done, on_error)
+        self.report()
+
+    def collect(self, finished, on_error):
+        for future in finished:
+            error = future.exception()
+            if error is None:
+                continue
+            if on_error is None:
+                raise error
+            on_error(error)
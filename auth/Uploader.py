@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 """Upload a WikidataItem to Wikidata."""
+from collections import OrderedDict
 from os import path
 
 from wikidataStuff.WikidataStuff import WikidataStuff as WDS
 import pywikibot
 
 import importer_utils as utils
+import entity_diff
 
 
 MAPPING_DIR = "mappings"
@@ -14,6 +16,10 @@ PROPS = utils.load_json(path.join(MAPPING_DIR, "properties.json"))
 SUMMARY_TEST = "test"
 
 
+def call(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
 class Uploader(object):
 
     TEST_ITEM = "Q4115189"
@@ -24,8 +30,8 @@ class Uploader(object):
             label_content = label['value']
             language = label['language']
             labels_for_upload[language] = label_content
-        self.wdstuff.add_multiple_label_or_alias(
-            labels_for_upload, target_item)
+        self.edit(self.wdstuff.add_multiple_label_or_alias,
+                  labels_for_upload, target_item)
 
     def add_descriptions(self, target_item, descriptions):
         descriptions_for_upload = {}
@@ -33,43 +39,172 @@ class Uploader(object):
             desc_content = description['value']
             lang = description['language']
             descriptions_for_upload[lang] = desc_content
-        self.wdstuff.add_multiple_descriptions(
-            descriptions_for_upload, target_item)
+        self.edit(self.wdstuff.add_multiple_descriptions,
+                  descriptions_for_upload, target_item)
 
     def add_claims(self, wd_item, claims):
         if wd_item:
+            wd_item.get()  # no request if the item was prefetched
             for claim in claims:
-                wd_item.get()
                 prop = claim["prop"]
                 value = claim["value"]
                 ref = claim["ref"]
-                self.wdstuff.addNewClaim(prop, value, wd_item, ref)
+                self.edit(self.wdstuff.addNewClaim, prop, value, wd_item, ref)
 
-    def create_new_item(self):
-        return self.wdstuff.make_new_item({}, self.summary)
+    def create_new_item(self, data=None):
+        return self.edit(self.wdstuff.make_new_item, data or {}, self.summary)
+
+    def make_claim(self, prop, statement):
+        """Build an unattached pywikibot.Claim from a Statement."""
+        claim = pywikibot.Claim(self.repo, prop)
+        if statement.special:
+            claim.setSnakType(statement.itis)
+        else:
+            claim.setTarget(statement.itis)
+        for qual in statement.quals:
+            qualifier = pywikibot.Claim(self.repo, qual.prop, is_qualifier=True)
+            qualifier.setTarget(qual.itis)
+            claim.addQualifier(qualifier)
+        return claim
+
+    def make_reference_json(self, ref):
+        """Convert a Reference into wbeditentity reference json."""
+        snaks = OrderedDict()
+        for source in ref.get_all_sources():
+            source_json = source.toJSON()
+            snak = source_json.get("mainsnak", source_json)
+            snaks.setdefault(source.getID(), []).append(snak)
+        return {"snaks": snaks, "snaks-order": list(snaks.keys())}
+
+    def make_label_data(self, wd_item, data):
+        """
+        Add labels, aliases and descriptions to the entity json.
+
+        The first label in a language becomes the label if the item
+        lacks one, any other new names are added as aliases.
+        Existing descriptions are left alone.
+        """
+        labels = {}
+        aliases = {}
+        descriptions = {}
+        if wd_item:
+            labels = dict(wd_item.labels)
+            aliases = {lang: list(names)
+                       for lang, names in wd_item.aliases.items()}
+            descriptions = dict(wd_item.descriptions)
+        for label in self.data["labels"]:
+            lang = label["language"]
+            value = label["value"]
+            if lang not in labels:
+                labels[lang] = value
+                data["labels"][lang] = {"language": lang, "value": value}
+            elif value != labels[lang] and value not in aliases.get(lang, []):
+                aliases.setdefault(lang, []).append(value)
+                data["aliases"].setdefault(lang, []).append(
+                    {"language": lang, "value": value, "add": ""})
+        for description in self.data["descriptions"]:
+            lang = description["language"]
+            if lang not in descriptions:
+                descriptions[lang] = description["value"]
+                data["descriptions"][lang] = {"language": lang,
+                                              "value": description["value"]}
+
+    def make_claim_data(self, wd_item, data):
+        """
+        Add all statements, with references, to the entity json.
+
+        Statements already on the item are only sent again if they
+        lack the reference, which is then appended to them.
+        """
+        existing = wd_item.claims if wd_item else {}
+        added = {}
+        for statement in self.data["statements"]:
+            prop = statement["prop"]
+            value = statement["value"]
+            ref = statement["ref"]
+            claim = entity_diff.find_matching_claim(existing.get(prop, []),
+                                                    value)
+            if claim is not None:
+                if ref and not entity_diff.has_reference(claim, ref):
+                    claim_json = claim.toJSON()
+                    claim_json.setdefault("references", []).append(
+                        self.make_reference_json(ref))
+                    data["claims"].append(claim_json)
+                continue
+            if entity_diff.find_matching_claim(added.get(prop, []), value):
+                continue
+            claim = self.make_claim(prop, value)
+            added.setdefault(prop, []).append(claim)
+            claim_json = claim.toJSON()
+            if ref:
+                claim_json["references"] = [self.make_reference_json(ref)]
+            data["claims"].append(claim_json)
+
+    def make_entity_data(self, wd_item=None):
+        """Build the wbeditentity json for the whole item."""
+        data = {"labels": {}, "aliases": {}, "descriptions": {}, "claims": []}
+        self.make_label_data(wd_item, data)
+        self.make_claim_data(wd_item, data)
+        return {key: value for key, value in data.items() if value}
+
+    def upload_batch(self):
+        """
+        Write labels, descriptions and claims in a single edit.
+
+        :return: "created", "updated", or "skipped" if there was
+            nothing to write
+        """
+        if self.wd_item is None:
+            data = self.make_entity_data()
+            self.wd_item = self.create_new_item(data)
+            self.wd_item_q = self.wd_item.getID()
+            self.created = True
+            return "created"
+        self.wd_item.get()  # no request if the item was prefetched
+        data = self.make_entity_data(self.wd_item)
+        if not data:
+            return "skipped"
+        self.edit(self.wd_item.editEntity, data, summary=self.summary)
+        return "updated"
 
     def get_username(self):
         return pywikibot.config.usernames["wikidata"]["wikidata"]
 
     def upload(self):
+        """
+        Upload the item.
+
+        :return: "skipped", "created" or "updated"
+        """
         if self.data["upload"] is False:
             print("SKIPPING ITEM")
-            return
-        labels = self.data["labels"]
-        descriptions = self.data["descriptions"]
-        claims = self.data["statements"]
-        self.add_labels(self.wd_item, labels)
-        self.add_descriptions(self.wd_item, descriptions)
-        self.add_claims(self.wd_item, claims)
+            return "skipped"
+        if self.batch:
+            return self.upload_batch()
+        else:
+            labels = self.data["labels"]
+            descriptions = self.data["descriptions"]
+            claims = self.data["statements"]
+            self.add_labels(self.wd_item, labels)
+            self.add_descriptions(self.wd_item, descriptions)
+            self.add_claims(self.wd_item, claims)
+        return "created" if self.created else "updated"
 
     def set_wd_item(self):
         if self.live:
-            if self.data["wd-item"] is None:
+            if self.data["wd-item"] is None and self.batch:
+                # created together with its data in upload_batch
+                self.wd_item = None
+                self.wd_item_q = None
+            elif self.data["wd-item"] is None:
                 self.wd_item = self.create_new_item()
                 self.wd_item_q = self.wd_item.getID()
+                self.created = True
             else:
                 item_q = self.data["wd-item"]
-                self.wd_item = self.wdstuff.QtoItemPage(item_q)
+                # reuse the item loaded by entity_diff.mark_unchanged
+                self.wd_item = self.data.get("loaded-item") or \
+                    self.wdstuff.QtoItemPage(item_q)
                 self.wd_item_q = item_q
         else:
             self.wd_item = self.wdstuff.QtoItemPage(self.TEST_ITEM)
@@ -79,9 +214,18 @@ class Uploader(object):
                  data_object,
                  repo,
                  live=False,
-                 edit_summary=None):
+                 edit_summary=None,
+                 batch=False,
+                 edit=None):
+        """
+        :param edit: function making a write call, edit(func, *args),
+            e.g. UploadScheduler.edit. By default the call is made as is.
+        """
         self.repo = repo
         self.live = live
+        self.batch = batch
+        self.created = False
+        self.edit = edit or call
         if self.live:
             print("LIVE MODE")
             self.summary = edit_summary
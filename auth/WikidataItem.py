@@ -1,19 +1,27 @@
 # -*- coding: utf-8 -*-
-from wikidataStuff.WikidataStuff import WikidataStuff as WDS
 from wikidataStuff import helpers as helpers
 import pywikibot
 
 import importer_utils as utils
+from shared import dates
+import interning
+import payload
 
 DATA_DIR = "data"
 
 
 class WikidataItem(object):
 
-    def __init__(self, db_row_dict, repository, data_files, existing):
+    def __init__(self, db_row_dict, repository, data_files, existing,
+                 compact=False):
+        """
+        :param compact: store statements, labels and references as
+            compact tuples instead of pywikibot objects, see to_payload
+        """
+        self.compact = compact
         self.repo = repository
         self.existing = existing
-        self.wdstuff = WDS(self.repo)
+        self.wdstuff = interning.get_wdstuff(self.repo)
         self.raw_data = db_row_dict
         self.props = data_files["properties"]
         self.construct_wd_item()
@@ -21,7 +29,7 @@ class WikidataItem(object):
         self.problem_report = {}
 
     def make_q_item(self, qnumber):
-        return self.wdstuff.QtoItemPage(qnumber)
+        return interning.get_item_page(self.repo, qnumber)
 
     def make_pywikibot_item(self, value):
         val_item = None
@@ -34,16 +42,16 @@ class WikidataItem(object):
         elif isinstance(value, dict) and 'quantity_value' in value:
             number = value['quantity_value']
             if 'unit' in value:
-                unit = self.wdstuff.QtoItemPage(value["unit"])
+                unit = self.make_q_item(value["unit"])
             else:
                 unit = None
             val_item = pywikibot.WbQuantity(
                 amount=number, unit=unit, site=self.repo)
         elif isinstance(value, dict) and 'date_value' in value:
             date_dict = value["date_value"]
-            val_item = pywikibot.WbTime(year=date_dict.get("year"),
-                                        month=date_dict.get("month"),
-                                        day=date_dict.get("day"))
+            val_item = interning.get_wb_time(date_dict.get("year"),
+                                             date_dict.get("month"),
+                                             date_dict.get("day"))
         elif value == "novalue":
             #  raise NotImplementedError
             #  implement Error
@@ -61,7 +69,9 @@ class WikidataItem(object):
 
     def make_qualifier_applies_to(self, value):
         prop_item = self.props["applies_to_part"]
-        target_item = self.wdstuff.QtoItemPage(value)
+        if self.compact:
+            return (payload.decode_pid(prop_item), payload.encode_value(value))
+        target_item = self.make_q_item(value)
         return self.wdstuff.Qualifier(prop_item, target_item)
 
     def add_statement(self, prop_name, value, quals=None, ref=None):
@@ -69,6 +79,11 @@ class WikidataItem(object):
         prop = self.props[prop_name]
         if quals is None:
             quals = []
+        if self.compact:
+            base.append(payload.StatementRecord(
+                payload.decode_pid(prop), payload.encode_value(value),
+                tuple(helpers.listify(quals)), ref))
+            return
         wd_claim = self.make_pywikibot_item(value)
         statement = self.make_statement(wd_claim)
         for qual in helpers.listify(quals):
@@ -82,19 +97,22 @@ class WikidataItem(object):
                            pub_date,
                            ref_url=None,
                            retrieved_date=None):
+        if self.compact:
+            return self.make_compact_stated_in_ref(
+                value, pub_date, ref_url, retrieved_date)
         item_prop = self.props["stated_in"]
         published_prop = self.props["publication_date"]
-        pub_date = utils.date_to_dict(pub_date, "%Y-%m-%d")
+        pub_date = dates.date_to_dict(pub_date, "%Y-%m-%d")
         timestamp = self.make_pywikibot_item({"date_value": pub_date})
         published_claim = self.wdstuff.make_simple_claim(
             published_prop, timestamp)
-        source_item = self.wdstuff.QtoItemPage(value)
+        source_item = self.make_q_item(value)
         source_claim = self.wdstuff.make_simple_claim(item_prop, source_item)
         if ref_url and retrieved_date:
             ref_url_prop = self.props["reference_url"]
             retrieved_date_prop = self.props["retrieved"]
 
-            retrieved_date = utils.date_to_dict(retrieved_date, "%Y-%m-%d")
+            retrieved_date = dates.date_to_dict(retrieved_date, "%Y-%m-%d")
             retrieved_date = self.make_pywikibot_item(
                 {"date_value": retrieved_date})
 
@@ -113,6 +131,39 @@ class WikidataItem(object):
             )
         return ref
 
+    def make_compact_stated_in_ref(self,
+                                   value,
+                                   pub_date,
+                                   ref_url=None,
+                                   retrieved_date=None):
+        """Same as make_stated_in_ref but as a tuple of snak tuples."""
+        def snak(prop_name, target):
+            return (payload.decode_pid(self.props[prop_name]),
+                    payload.encode_value(target))
+
+        pub_date = {"date_value": dates.date_to_dict(pub_date, "%Y-%m-%d")}
+        source_test = [snak("stated_in", value)]
+        source_notest = [snak("publication_date", pub_date)]
+        if ref_url and retrieved_date:
+            retrieved_date = {"date_value": dates.date_to_dict(
+                retrieved_date, "%Y-%m-%d")}
+            source_test.append(snak("reference_url", ref_url))
+            source_notest.append(snak("retrieved", retrieved_date))
+        return (tuple(source_test), tuple(source_notest))
+
+    def to_payload(self):
+        """Get the compact, picklable payload of a compact item."""
+        wd_item = self.wd_item
+        qid = wd_item["wd-item"]
+        return payload.Payload(
+            self.raw_data,
+            int(qid[1:]) if qid else None,
+            wd_item["upload"],
+            tuple((x["language"], x["value"]) for x in wd_item["labels"]),
+            tuple((x["language"], x["value"])
+                  for x in wd_item["descriptions"]),
+            tuple(wd_item["statements"]))
+
     def associate_wd_item(self, wd_item):
         if wd_item is not None:
             self.wd_item["wd-item"] = wd_item
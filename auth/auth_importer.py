@@ -1,70 +1,238 @@
 #!/usr/bin/env python3
 import argparse
+import multiprocessing
 import pywikibot
 import os
 
-import wikidataStuff.wdqsLookup as lookup
 import importer_utils as utils
+from shared import bundle
+from shared import labels
+import existing_items
+import dump_reader
+import entity_diff
+from reconcile import Reconciler
+from utils import iter_jsonl
 from Person import Person
+from Journal import Journal
 from Uploader import Uploader
+from UploadScheduler import MAX_RATE, RateLimiter, UploadScheduler
 
 AUTH_FILE = "authority.json"
+AUTH_JSONL_FILE = "authority.jsonl"
+JOURNAL_FILE = "auth_journal_{}.jsonl"  # one journal per upload mode
 MAPPINGS = "mappings"
+WORKER_CHUNKSIZE = 50
 
+worker_state = {}
 
-def get_wd_items_using_prop(prop):
-    items = {}
-    print("WILL NOW DOWNLOAD WD ITEMS THAT USE " + prop)
-    query = "SELECT DISTINCT ?item ?value  WHERE {?item p:" + \
-        prop + "?statement. OPTIONAL { ?item wdt:" + prop + " ?value. }}"
-    data = lookup.make_simple_wdqs_query(query, verbose=False)
-    for x in data:
-        key = lookup.sanitize_wdqs_result(x['item'])
-        value = x['value']
-        items[value] = key
-    print("FOUND {} WD ITEMS WITH PROP {}".format(len(items), prop))
-    return items
 
+def load_mapping_files(dump_data=None, reconciler=None):
+    """
+    Load the mapping files.
 
-def load_mapping_files():
+    :param dump_data: structures read from a Wikidata dump, these
+        replace the first/last name files and extend the
+        professions mapping, whose own entries take precedence
+    :param reconciler: Reconciler for people without P4357
+
+    Mapping files compiled with shared/bundle.py are read from the bundle.
+    """
     mappings = {}
     available = ["first", "last", "professions", "properties"]
+    indexed = ["first", "last"]
     for title in available:
+        if dump_data and title in indexed:
+            mappings[title] = dump_data[title]
+            continue
         f = os.path.join(MAPPINGS, '{}.json'.format(title))
+        compiled = bundle.open_table(f)
+        if compiled is not None:
+            mappings[title] = compiled
+            continue
         mappings[title] = utils.load_json(f)
+        if title in indexed:
+            mappings[title] = labels.make_label_index(mappings[title])
+    if dump_data:
+        professions = dict(dump_data["professions"])
+        professions.update(mappings["professions"])
+        mappings["professions"] = professions
+    if reconciler:
+        mappings["reconciler"] = reconciler
     print("Loaded mappings: {}.".format(", ".join(available)))
     return mappings
 
 
-def load_auth_file():
-    return utils.load_json(AUTH_FILE)
+def load_auth_file(offset=None, limit=None):
+    """
+    Load authority records, restricted to offset and limit.
+
+    The JSON Lines version of the file is streamed if it is at least
+    as new as the json version, otherwise the whole json list is loaded
+    and sliced.
+    """
+    if os.path.exists(AUTH_JSONL_FILE) and (
+            not os.path.exists(AUTH_FILE) or
+            os.path.getmtime(AUTH_JSONL_FILE) >=
+            os.path.getmtime(AUTH_FILE)):
+        print("Reading {}.".format(AUTH_JSONL_FILE))
+        return iter_jsonl(AUTH_JSONL_FILE, offset, limit)
+    print("Reading {}.".format(AUTH_FILE))
+    auth_data = utils.load_json(AUTH_FILE)
+    if offset:
+        auth_data = auth_data[offset:]
+    if limit:
+        auth_data = auth_data[:limit]
+    return auth_data
+
+
+def get_id_no(p):
+    return list(p.keys())[0]
+
+
+def filter_journaled(auth_data, journal, resume, retry_failed):
+    """
+    Drop records according to the outcome of earlier runs.
+
+    :param resume: skip records that were already uploaded or skipped
+    :param retry_failed: only keep records whose last attempt failed
+    """
+    for p in auth_data:
+        id_no = get_id_no(p)
+        if retry_failed and not journal.is_failed(id_no):
+            continue
+        if resume and journal.is_done(id_no):
+            continue
+        yield p
+
+
+def make_person(p, wikidata_site, data_files, existing_people,
+                compact=False):
+    p_data = p[get_id_no(p)]
+    return Person(p_data, wikidata_site, data_files, existing_people,
+                  compact)
+
+
+def init_worker(existing_people, dump_data, reconciler):
+    """Load the site and mappings once in every worker process."""
+    worker_state["site"] = utils.create_site_instance("wikidata", "wikidata")
+    worker_state["data_files"] = load_mapping_files(dump_data, reconciler)
+    worker_state["existing"] = existing_people
+
+
+def make_payload_in_worker(p):
+    person = make_person(p, worker_state["site"],
+                         worker_state["data_files"], worker_state["existing"],
+                         compact=True)
+    return person.to_payload()
+
+
+def build_people(auth_data, wikidata_site, existing_people, workers=None,
+                 dump_data=None, humans=None):
+    """
+    Construct Person objects for the authority records, in input order.
+
+    With more than one worker the people are built in a process pool,
+    each worker loading the mappings once. Workers send back compact
+    payloads, which are turned into pywikibot objects one at a time
+    as they are consumed.
+
+    :param humans: snapshot of Swedish humans to reconcile unmatched
+        people against, see dump_reader.write_humans. It is indexed
+        once here and shared with forked workers copy-on-write.
+    """
+    reconciler = Reconciler.from_file(humans) if humans else None
+    if workers and workers > 1:
+        print("Using {} workers.".format(workers))
+        context = multiprocessing.get_context("fork")
+        with context.Pool(workers, init_worker,
+                          (existing_people, dump_data, reconciler)) as pool:
+            for payload in pool.imap(make_payload_in_worker, auth_data,
+                                     WORKER_CHUNKSIZE):
+                yield payload.materialize(wikidata_site)
+    else:
+        data_files = load_mapping_files(dump_data, reconciler)
+        for p in auth_data:
+            yield make_person(p, wikidata_site, data_files, existing_people)
 
 
 def main(arguments):
     arguments = vars(arguments)
     wikidata_site = utils.create_site_instance("wikidata", "wikidata")
-    existing_people = get_wd_items_using_prop("P4357")
-    auth_data = load_auth_file()
-    data_files = load_mapping_files()
+    dump_data = None
+    if arguments["dump"]:
+        dump_data = dump_reader.read_dump(arguments["dump"])
+        existing_people = dump_data["existing"]
+    else:
+        existing_people = existing_items.get_existing_items(
+            "P4357",
+            offline=arguments["offline_existing"],
+            refresh=arguments["refresh_existing"])
     if arguments["offset"]:
         print("Using offset: {}.".format(str(arguments["offset"])))
-        auth_data = auth_data[arguments["offset"]:]
     if arguments["limit"]:
         print("Using limit: {}.".format(str(arguments["limit"])))
-        auth_data = auth_data[:arguments["limit"]]
-    for p in auth_data:
-        p_data = p[list(p.keys())[0]]
-        person = Person(p_data, wikidata_site, data_files, existing_people)
-        if arguments["upload"]:
-            live = True if arguments["upload"] == "live" else False
+    auth_data = load_auth_file(arguments["offset"], arguments["limit"])
+    live = True if arguments["upload"] == "live" else False
+    journal = Journal(JOURNAL_FILE.format("live" if live else "sandbox"))
+    if arguments["resume"] or arguments["retry_failed"]:
+        auth_data = filter_journaled(auth_data, journal, arguments["resume"],
+                                     arguments["retry_failed"])
+    people = build_people(auth_data, wikidata_site, existing_people,
+                          arguments["workers"], dump_data,
+                          arguments["humans"])
+    if not arguments["upload"]:
+        # dry run, only build the items
+        for _ in people:
+            pass
+        return
+    if arguments["skip_unchanged"] and live:
+        people = entity_diff.mark_unchanged(people, wikidata_site)
+    jobs = (make_upload_job(person, wikidata_site, live, arguments["batch"],
+                            journal)
+            for person in people)
+    if arguments["uploaders"] and arguments["uploaders"] > 1:
+        # our own rate limiter decides how fast to edit
+        pywikibot.config.put_throttle = 0
+        limiter = RateLimiter(max_rate=arguments["max_rate"])
+        scheduler = UploadScheduler(arguments["uploaders"], limiter)
+        scheduler.run(jobs, on_error=report_upload_error)
+    else:
+        for job in jobs:
+            try:
+                job()
+            except pywikibot.Error:
+                continue
+
+
+def make_upload_job(person, wikidata_site, live, batch, journal):
+    id_no = person.raw_data["id_no"]
+    created_qid = journal.get_failed_qid(id_no)
+    if created_qid and person.wd_item["wd-item"] is None:
+        # created by an attempt that failed afterwards, don't create it again
+        person.wd_item["wd-item"] = created_qid
+
+    def job(edit=None):
+        uploader = None
+        try:
             uploader = Uploader(person,
                                 repo=wikidata_site,
                                 live=live,
-                                edit_summary="importing #Musikverket authority file")
-            try:
-                uploader.upload()
-            except pywikibot.data.api.APIError:
-                continue
+                                edit_summary="importing #Musikverket authority file",
+                                batch=batch,
+                                edit=edit)
+            status = uploader.upload()
+        except pywikibot.Error as error:
+            qid = uploader.wd_item_q if uploader else created_qid
+            journal.record(id_no, Journal.FAILED, qid, reason=str(error))
+            raise
+        journal.record(id_no, status, uploader.wd_item_q)
+    return job
+
+
+def report_upload_error(error):
+    if not isinstance(error, pywikibot.Error):
+        raise error
+    print("Upload failed: {}".format(error))
 
 
 if __name__ == "__main__":
@@ -79,5 +247,26 @@ if __name__ == "__main__":
                         nargs='?',
                         type=int,
                         action='store')
+    parser.add_argument("--batch", action='store_true')
+    parser.add_argument("--dump", action='store')
+    parser.add_argument("--humans", action='store')
+    parser.add_argument("--offline-existing", action='store_true')
+    parser.add_argument("--refresh-existing", action='store_true')
+    parser.add_argument("--skip-unchanged", action='store_true')
+    parser.add_argument("--resume", action='store_true')
+    parser.add_argument("--retry-failed", action='store_true')
+    parser.add_argument("--uploaders",
+                        nargs='?',
+                        type=int,
+                        action='store')
+    parser.add_argument("--max_rate",
+                        nargs='?',
+                        type=float,
+                        default=MAX_RATE,
+                        action='store')
+    parser.add_argument("--workers",
+                        nargs='?',
+                        type=int,
+                        action='store')
     args = parser.parse_args()
     main(args)
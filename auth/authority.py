@@ -1,15 +1,27 @@
 #!/usr/bin/python
 # -*- coding: utf-8  -*-
 import argparse
-import batchupload.common as common
 import batchupload.helpers as helpers
-from xml.dom.minidom import parseString
 import utils
+from shared import dates
 import os
-import re
 import json
+from shared import shards
 
 MAPPINGS = "mappings"
+TAGS = {
+    'last': 'Surname',
+    'full': 'PersonName',
+    'first': 'Forenames',
+    'dates_places': 'DatesAndPlaces',
+    'dates': 'Dates',
+    'gender': 'Gender',
+    'id_no': 'Code',
+    'corporate_name': 'CorporateName',
+    'profession': 'Epithet',
+    'parallell_name': "ParallelEntry",
+    'not_preferred_name': 'NonPreferredTerm'
+}
 
 
 class Person(object):
@@ -32,26 +44,9 @@ class Person(object):
                 other_names.append(n)
         self.data["clean"]["other_names"] = other_names
 
-    def attempt_exact_dates(self):
-        raw = self.data["dates_places"].lower()
-        pattern_born = re.compile("född [0-9]{4}-[0-9]{2}-[0-9]{2}")
-        pattern_dead = re.compile("död [0-9]{4}-[0-9]{2}-[0-9]{2}")
-        if pattern_born.findall(raw):
-            self.data["clean"]["birth"] = helpers.isoDate(pattern_born.findall(raw)[
-                0].split(" ")[1])
-        if pattern_dead.findall(raw):
-            self.data["clean"]["death"] = helpers.isoDate(pattern_dead.findall(raw)[
-                0].split(" ")[1])
-
     def process_dates(self):
-        if "-" in self.data["dates"]:
-            birth = self.data["dates"].split("-")[0].strip()
-            death = self.data["dates"].split("-")[1].strip()
-            if "?" not in birth:
-                self.data["clean"]["birth"] = birth
-            if "?" not in death:
-                self.data["clean"]["death"] = death
-            self.attempt_exact_dates()
+        self.data["clean"].update(dates.parse_lifespan(
+            self.data["dates"], self.data["dates_places"]))
 
     def split_professions(self):
         professions = []
@@ -96,60 +91,71 @@ class Person(object):
             self.process_gender()
 
 
-def load_data(in_file):
-    return common.open_and_read_file(in_file, as_json=False)
-
-
-def xml_to_people(raw):
-    raw = utils.character_cleanup(raw)
-    people = []
-    dom = parseString(raw)
-    records = dom.getElementsByTagName("DScribeRecord")
-    tags = {
-        'last': 'Surname',
-        'full': 'PersonName',
-        'first': 'Forenames',
-        'dates_places': 'DatesAndPlaces',
-        'dates': 'Dates',
-        'gender': 'Gender',
-        'id_no': 'Code',
-        'corporate_name': 'CorporateName',
-        'profession': 'Epithet',
-        'parallell_name': "ParallelEntry",
-        'not_preferred_name': 'NonPreferredTerm'
-    }
-    for record in records:
-        person = {}
-        for tag in tags:
-            lookup = tags[tag]
-            try:
-                content = record.getElementsByTagName(
-                    lookup)[0].firstChild.nodeValue
-            except (AttributeError, IndexError):
-                content = ""
-            person[tag] = content.strip()
-        people.append(Person(person))
-    return people
+def record_to_dict(record, tags):
+    """Get the first text of each tag in a record, "" if missing."""
+    content = {}
+    for tag in tags:
+        node = next(record.iter(tags[tag]), None)
+        text = node.text if node is not None else None
+        content[tag] = (text or "").strip()
+    return content
+
+
+def parse_shard(in_file, start, end, tags):
+    """Get the people in a byte range of the file."""
+    with open(in_file, 'rb') as f:
+        source = utils.CleanupReader(shards.ShardReader(f, start, end))
+        return [Person(record_to_dict(record, tags))
+                for record in shards.iter_records(source)]
+
+
+def xml_to_people(in_file, workers=None):
+    if workers and workers > 1:
+        for person in shards.parse_shards(in_file, parse_shard, workers,
+                                          TAGS):
+            yield person
+        return
+    with open(in_file, encoding="utf-8") as f:
+        for record in shards.iter_records(utils.CleanupReader(f)):
+            yield Person(record_to_dict(record, TAGS))
 
 
 def people_to_file(people, filename):
-    dump = []
-    for person in people:
-        dump.append({person.data["id_no"]: person.data["clean"]})
+    """Write people as an indented json list, one person at a time."""
+    separator = "["
     with open(filename, 'w') as f:
-        json.dump(dump, f, sort_keys=True,
-                  indent=4,
-                  ensure_ascii=False)
+        for person in people:
+            entry = json.dumps({person.data["id_no"]: person.data["clean"]},
+                               sort_keys=True,
+                               indent=4,
+                               ensure_ascii=False)
+            f.write(separator + "\n")
+            f.write("\n".join("    " + line for line in entry.splitlines()))
+            separator = ","
+        f.write("[]" if separator == "[" else "\n]")
+
+
+def people_to_jsonl(people, filename):
+    """Write people as JSON Lines, with a byte offset index."""
+    entries = ({person.data["id_no"]: person.data["clean"]}
+               for person in people)
+    utils.jsonl_to_file(filename, entries)
 
 
 def main(arguments):
-    raw_xml = load_data(arguments.in_file)
-    people = xml_to_people(raw_xml)
-    people_to_file(people, "authority.json")
+    people = xml_to_people(arguments.in_file, arguments.workers)
+    if arguments.format == "jsonl":
+        people_to_jsonl(people, "authority.jsonl")
+    else:
+        people_to_file(people, "authority.json")
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--in_file", default="authority.xml")
+    parser.add_argument("--format", choices=["json", "jsonl"],
+                        default="json")
+    parser.add_argument("--workers", type=int,
+                        help="parse the xml in this many processes")
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Read the structures needed for matching people from a Wikidata json dump.
+
+The dump is read line by line and only lines that can be relevant
+are decoded, which keeps the pass close to the speed of decompression.
+"""
+import argparse
+import bz2
+import gzip
+import json
+
+from shared import labels
+
+PROP = "P4357"
+GIVEN_NAMES = ("Q202444", "Q12308941", "Q11879590", "Q3409032")
+FAMILY_NAMES = ("Q101352",)
+PROFESSIONS = ("Q28640", "Q12737077")
+LANGUAGES = ("sv", "en")
+HUMAN = "Q5"
+SWEDEN = "Q34"
+
+
+def open_dump(filename):
+    if filename.endswith(".bz2"):
+        return bz2.open(filename, "rb")
+    elif filename.endswith(".gz"):
+        return gzip.open(filename, "rb")
+    return open(filename, "rb")
+
+
+def make_markers():
+    """Byte strings of which at least one is in every relevant line."""
+    markers = [('"' + PROP + '"').encode("utf-8")]
+    for qid in GIVEN_NAMES + FAMILY_NAMES + PROFESSIONS:
+        markers.append('"id":"{}"'.format(qid).encode("utf-8"))
+    return markers
+
+
+def iter_entities(filename, markers=None, required=()):
+    """
+    Yield decoded entities from lines containing any marker.
+
+    :param required: byte strings that must all be in the line as well
+    """
+    markers = markers or make_markers()
+    with open_dump(filename) as f:
+        for line in f:
+            if not any(marker in line for marker in markers):
+                continue
+            if not all(marker in line for marker in required):
+                continue
+            line = line.rstrip(b",\r\n")
+            yield json.loads(line.decode("utf-8"))
+
+
+def get_label(entity, languages=LANGUAGES):
+    labels = entity.get("labels", {})
+    for lang in languages:
+        if lang in labels:
+            return labels[lang]["value"]
+
+
+def get_values(entity, prop):
+    """Get the plain values of all claims with a property."""
+    values = []
+    for claim in entity.get("claims", {}).get(prop, []):
+        datavalue = claim["mainsnak"].get("datavalue")
+        if not datavalue:
+            continue
+        value = datavalue["value"]
+        if isinstance(value, dict) and "id" in value:
+            value = value["id"]
+        values.append(value)
+    return values
+
+
+def read_dump(filename):
+    """
+    Collect the matching structures in a single pass over a dump.
+
+    :return: dict with
+        existing: P4357 value -> QID
+        first, last: label -> (QID, number of matches),
+                     made by labels.make_label_index
+        professions: lowercase Swedish label -> QID
+    """
+    data = {"existing": {}, "professions": {}}
+    names = {"first": [], "last": []}
+    for entity in iter_entities(filename):
+        qid = entity["id"]
+        for value in get_values(entity, PROP):
+            data["existing"][value] = qid
+        instance_of = get_values(entity, "P31")
+        label = get_label(entity)
+        if not label:
+            continue
+        if any(x in GIVEN_NAMES for x in instance_of):
+            names["first"].append({"itemLabel": label, "item": qid})
+        if any(x in FAMILY_NAMES for x in instance_of):
+            names["last"].append({"itemLabel": label, "item": qid})
+        if any(x in PROFESSIONS for x in instance_of):
+            sv_label = get_label(entity, ("sv",))
+            if sv_label:
+                data["professions"][sv_label.lower()] = qid
+    for kind, entries in names.items():
+        data[kind] = labels.make_label_index(entries)
+    print("Read from dump: {} items with {}, {} first names, "
+          "{} last names, {} professions.".format(
+              len(data["existing"]), PROP, len(data["first"]),
+              len(data["last"]), len(data["professions"])))
+    return data
+
+
+def get_year(entity, prop):
+    for value in get_values(entity, prop):
+        if isinstance(value, dict) and "time" in value:
+            # "+1850-03-02T00:00:00Z"
+            return int(value["time"][1:5])
+
+
+def write_humans(filename, out_file):
+    """
+    Write a snapshot of Swedish humans for reconcile.Reconciler.
+
+    One json line per human with Swedish citizenship and no P4357
+    value, holding the QID, Swedish and English labels and Swedish
+    aliases, and the years of birth and death.
+    """
+    human = '"id":"{}"'.format(HUMAN).encode("utf-8")
+    sweden = '"id":"{}"'.format(SWEDEN).encode("utf-8")
+    count = 0
+    with open(out_file, 'w') as f:
+        for entity in iter_entities(filename, [human], [sweden]):
+            if HUMAN not in get_values(entity, "P31") or \
+                    SWEDEN not in get_values(entity, "P27"):
+                continue
+            if get_values(entity, PROP):
+                # already linked, matched through the existing items
+                continue
+            names = [get_label(entity, (lang,)) for lang in LANGUAGES]
+            names += [x["value"]
+                      for x in entity.get("aliases", {}).get("sv", [])]
+            candidate = {"qid": entity["id"],
+                         "names": [x for x in names if x],
+                         "birth": get_year(entity, "P569"),
+                         "death": get_year(entity, "P570")}
+            f.write(json.dumps(candidate, ensure_ascii=False) + "\n")
+            count += 1
+    print("Wrote {} humans to {}.".format(count, out_file))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dump", required=True)
+    parser.add_argument("--humans_out", default="humans.jsonl")
+    args = parser.parse_args()
+    write_humans(args.dump, args.humans_out)
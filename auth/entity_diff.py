@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Compare WikidataItem payloads to the items they would be written to."""
+import pywikibot
+from pywikibot import pagegenerators
+
+PREFETCH_SIZE = 50
+
+
+def find_matching_claim(claims, statement):
+    """Find the claim having the same value as a Statement."""
+    for claim in claims:
+        if statement.special:
+            if claim.getSnakType() == statement.itis:
+                return claim
+        elif claim.target_equals(statement.itis):
+            return claim
+
+
+def has_reference(claim, ref):
+    """Check if a claim already has a source matching the reference."""
+    for source in claim.getSources():
+        if all(any(s.target_equals(test.getTarget())
+                   for s in source.get(test.getID(), []))
+               for test in ref.source_test):
+            return True
+    return False
+
+
+def diff_item(wd_item, item):
+    """
+    List what the payload would add to an item.
+
+    :param wd_item: the wd_item dict of a WikidataItem
+    :param item: loaded pywikibot.ItemPage
+    :return: list of (kind, language or property, value),
+             empty if uploading would change nothing
+    """
+    changes = []
+    for label in wd_item["labels"]:
+        lang = label["language"]
+        names = [item.labels.get(lang)] + list(item.aliases.get(lang, []))
+        if label["value"] not in names:
+            changes.append(("label", lang, label["value"]))
+    for description in wd_item["descriptions"]:
+        lang = description["language"]
+        if lang not in item.descriptions:
+            changes.append(("description", lang, description["value"]))
+    for statement in wd_item["statements"]:
+        prop = statement["prop"]
+        claim = find_matching_claim(item.claims.get(prop, []),
+                                    statement["value"])
+        if claim is None:
+            changes.append(("claim", prop, statement["value"]))
+        elif statement["ref"] and not has_reference(claim, statement["ref"]):
+            changes.append(("reference", prop, statement["value"]))
+    return changes
+
+
+def prefetch_items(repo, qids):
+    """Load items in bulk, PREFETCH_SIZE per request."""
+    pages = [pywikibot.ItemPage(repo, qid) for qid in qids]
+    loaded = pagegenerators.PreloadingItemGenerator(pages, PREFETCH_SIZE)
+    return {page.getID(): page for page in loaded}
+
+
+def mark_unchanged(items, repo):
+    """
+    Stop items that are already up to date from being uploaded.
+
+    Items are handled in groups of PREFETCH_SIZE; the ones linked to
+    an existing Wikidata item are loaded together and compared to
+    their payload. Those without differences get upload=False, the
+    others keep the loaded item under "loaded-item" for the Uploader.
+
+    :param items: iterable of WikidataItem objects
+    """
+    group = []
+    for item in items:
+        group.append(item)
+        if len(group) == PREFETCH_SIZE:
+            for done in mark_group(group, repo):
+                yield done
+            group = []
+    for done in mark_group(group, repo):
+        yield done
+
+
+def mark_group(group, repo):
+    qids = [x.wd_item["wd-item"] for x in group if x.wd_item["wd-item"]]
+    loaded = prefetch_items(repo, qids) if qids else {}
+    unchanged = 0
+    for item in group:
+        page = loaded.get(item.wd_item["wd-item"])
+        if page is None:
+            continue
+        if diff_item(item.wd_item, page):
+            # handed to the Uploader, so it is not loaded again
+            item.wd_item["loaded-item"] = page
+        else:
+            item.wd_item["upload"] = False
+            unchanged += 1
+    if unchanged:
+        print("{} of {} items already up to date.".format(
+            unchanged, len(group)))
+    return group
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""Find Wikidata items using a property, with a local cache of the result."""
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import os
+import string
+import time
+
+import pywikibot
+import wikidataStuff.wdqsLookup as lookup
+import importer_utils as utils
+
+CACHE_FILE = "existing_{}.json"
+# WDQS lags behind Wikidata, so look back a bit further than the last run
+LAG_MARGIN = datetime.timedelta(hours=1)
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# the values are downloaded in ranges split at these characters, which
+# are in code point order as SPARQL compares strings that way
+RANGE_BOUNDS = string.digits + string.ascii_uppercase + string.ascii_lowercase
+# a range that keeps failing is split at these, finer, characters
+SPLIT_BOUNDS = "".join(sorted(
+    set(string.digits + string.ascii_letters + string.punctuation) -
+    set('"\\')))
+RANGE_RETRIES = 3
+# how many times a range that keeps failing is split into smaller ones
+MAX_SPLITS = 2
+WORKERS = 4
+
+
+def make_ranges(prefix="", upper=None, chars=RANGE_BOUNDS):
+    """
+    Split the values from prefix up to upper into ranges.
+
+    The ranges are cut at prefix followed by each of chars, so
+    together they cover exactly the values from prefix to upper.
+
+    :return: list of (lower, upper) bounds, None meaning no bound
+    """
+    bounds = [prefix + char for char in chars
+              if upper is None or prefix + char < upper]
+    return list(zip([prefix or None] + bounds, bounds + [upper]))
+
+
+def make_query(prop, since=None, lower=None, upper=None):
+    """
+    Build the query for the items using a property.
+
+    :param since: only items modified since this timestamp
+    :param lower: only values from this string on
+    :param upper: only values before this string
+    """
+    query = "SELECT DISTINCT ?item ?value WHERE {?item wdt:" + prop + \
+        " ?value."
+    if lower is not None:
+        query += " FILTER(?value >= \"" + lower + "\")"
+    if upper is not None:
+        query += " FILTER(?value < \"" + upper + "\")"
+    if since:
+        query += " ?item schema:dateModified ?modified." + \
+            " FILTER(?modified >= \"" + since + "\"^^xsd:dateTime)"
+    query += "}"
+    return query
+
+
+def add_results(items, data):
+    for x in data:
+        key = lookup.sanitize_wdqs_result(x['item'])
+        value = x['value']
+        items[value] = key
+
+
+def fetch_range(prop, lower, upper, since=None, splits=0):
+    """
+    Download the values in one range, retrying it on its own if it fails.
+
+    A range still failing after the retries is split into smaller
+    ranges, up to MAX_SPLITS times.
+
+    :return: list of WDQS results
+    """
+    query = make_query(prop, since, lower, upper)
+    name = "{}-{}".format(lower or "", upper or "")
+    for attempt in range(RANGE_RETRIES + 1):
+        try:
+            data = lookup.make_simple_wdqs_query(query, verbose=False)
+        except (pywikibot.exceptions.TimeoutError,
+                pywikibot.exceptions.ServerError, ValueError) as error:
+            data = None
+            print("Range {} failed: {}".format(name, error))
+        if data is not None:
+            return data
+        if attempt < RANGE_RETRIES:
+            time.sleep(2 ** attempt)
+    if splits < MAX_SPLITS:
+        print("Splitting range {}.".format(name))
+        data = []
+        for sub_lower, sub_upper in make_ranges(lower or "", upper,
+                                                SPLIT_BOUNDS):
+            data.extend(fetch_range(prop, sub_lower, sub_upper, since,
+                                    splits + 1))
+        return data
+    raise pywikibot.exceptions.ServerError(
+        "Could not download {} values in range {}".format(prop, name))
+
+
+def fetch_items(prop, since=None):
+    """
+    Download the items using a property, one value range at a time.
+
+    Every query only returns the values of one range, and WORKERS
+    ranges are downloaded at the same time.
+
+    :return: value -> QID dict
+    """
+    items = {}
+    with ThreadPoolExecutor(WORKERS) as executor:
+        for data in executor.map(
+                lambda bounds: fetch_range(prop, *bounds, since=since),
+                make_ranges()):
+            add_results(items, data)
+    return items
+
+
+def get_wd_items_using_prop(prop):
+    """Download all items using a property."""
+    print("WILL NOW DOWNLOAD WD ITEMS THAT USE " + prop)
+    items = fetch_items(prop)
+    print("FOUND {} WD ITEMS WITH PROP {}".format(len(items), prop))
+    return items
+
+
+def get_changed_items_using_prop(prop, since):
+    """
+    Download the items using a property modified since a timestamp.
+
+    Paged in value ranges like the full download, so a large delta
+    does not run into the query timeout either.
+    """
+    print("WILL NOW DOWNLOAD WD ITEMS THAT USE {} CHANGED SINCE {}".format(
+        prop, since))
+    items = fetch_items(prop, since)
+    print("FOUND {} CHANGED WD ITEMS WITH PROP {}".format(len(items), prop))
+    return items
+
+
+def load_cache(prop):
+    filename = CACHE_FILE.format(prop)
+    if os.path.exists(filename):
+        return utils.load_json(filename)
+
+
+def save_cache(prop, items, timestamp):
+    utils.json_to_file(CACHE_FILE.format(prop),
+                       {"timestamp": timestamp, "items": items})
+
+
+def get_existing_items(prop, offline=False, refresh=False):
+    """
+    Get a value -> QID dict of all items using a property.
+
+    The result is cached on disk. Later runs only ask for items
+    modified since the cache was written, which picks up new and
+    changed statements but not statements removed from an item;
+    use refresh to download everything again.
+
+    :param offline: only use the cache, never query WDQS
+    :param refresh: ignore the cache and download everything
+    """
+    cache = None if refresh else load_cache(prop)
+    if offline:
+        if cache is None:
+            print("No cached items for {}.".format(prop))
+            return {}
+        print("Using {} cached items for {} from {}.".format(
+            len(cache["items"]), prop, cache["timestamp"]))
+        return cache["items"]
+    started = datetime.datetime.now(datetime.timezone.utc) - LAG_MARGIN
+    if cache is None:
+        items = get_wd_items_using_prop(prop)
+    else:
+        items = cache["items"]
+        items.update(get_changed_items_using_prop(prop, cache["timestamp"]))
+    save_cache(prop, items, started.strftime(TIMESTAMP_FORMAT))
+    return items
@@ -9,6 +9,8 @@ import re
 import pywikibot
 from wikidataStuff.WikidataStuff import WikidataStuff as wds
 
+from shared import dates
+
 site_cache = {}
 
 
@@ -143,14 +145,7 @@ def date_to_dict(datestring, dateformat):
                        for example "%Y-%m-%d" which is the key for
                        the above timestamp.
     """
-    date_dict = {}
-    date_obj = datetime.datetime.strptime(datestring, dateformat)
-    date_dict["year"] = date_obj.year
-    if "%m" in dateformat:
-        date_dict["month"] = date_obj.month
-    if "%d" in dateformat:
-        date_dict["day"] = date_obj.day
-    return date_dict
+    return dates.date_to_dict(datestring, dateformat)
 
 
 def extract_municipality_name(category_name):
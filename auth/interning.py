@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Per-run caches for values that many WikidataItems have in common.
+
+ItemPages and WbTimes are only used as claim targets, which pywikibot
+never modifies, so a single instance per value can be shared by all
+items. Claims themselves are not cached since pywikibot binds a claim
+to the item it is added to.
+
+The caches are keyed on the repo object itself, which keeps it alive,
+so its id can not be reused by another repo.
+"""
+from wikidataStuff.WikidataStuff import WikidataStuff as WDS
+import pywikibot
+
+wdstuff_cache = {}
+item_cache = {}
+time_cache = {}
+
+
+def get_wdstuff(repo):
+    """Get the WikidataStuff instance shared by all items of a repo."""
+    key = repo
+    wdstuff = wdstuff_cache.get(key)
+    if wdstuff is None:
+        wdstuff = WDS(repo)
+        wdstuff_cache[key] = wdstuff
+    return wdstuff
+
+
+def get_item_page(repo, qid):
+    key = (repo, qid)
+    item = item_cache.get(key)
+    if item is None:
+        item = pywikibot.ItemPage(repo, qid)
+        item_cache[key] = item
+    return item
+
+
+def get_wb_time(year, month=None, day=None):
+    key = (year, month, day)
+    wb_time = time_cache.get(key)
+    if wb_time is None:
+        wb_time = pywikibot.WbTime(year=year, month=month, day=day)
+        time_cache[key] = wb_time
+    return wb_time
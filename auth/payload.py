@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Compact, picklable representation of a WikidataItem payload.
+
+Properties are stored as ints (P4357 -> 4357) and values as plain
+tuples, e.g. ("item", 5) or ("time", 1850, 3, 2). Nothing here refers
+to pywikibot until materialize() is called right before the upload.
+"""
+from collections import namedtuple
+
+import pywikibot
+
+import importer_utils as utils
+import interning
+
+ITEM = "item"
+TIME = "time"
+QUANTITY = "quantity"
+SPECIAL = "special"
+STRING = "string"
+
+# what the Uploader and the upload stage need of a WikidataItem
+UploadItem = namedtuple("UploadItem", ["raw_data", "wd_item"])
+
+
+class StatementRecord(object):
+    """One statement: property id, value, qualifiers and reference."""
+
+    __slots__ = ("pid", "value", "quals", "ref")
+
+    def __init__(self, pid, value, quals=(), ref=None):
+        self.pid = pid
+        self.value = value
+        self.quals = quals
+        self.ref = ref
+
+    def __getstate__(self):
+        return (self.pid, self.value, self.quals, self.ref)
+
+    def __setstate__(self, state):
+        self.pid, self.value, self.quals, self.ref = state
+
+
+class Payload(object):
+    """Everything the Uploader needs to upload one item."""
+
+    __slots__ = ("raw_data", "qid", "upload", "labels", "descriptions",
+                 "statements")
+
+    def __init__(self, raw_data, qid, upload, labels, descriptions,
+                 statements):
+        self.raw_data = raw_data
+        self.qid = qid
+        self.upload = upload
+        self.labels = labels
+        self.descriptions = descriptions
+        self.statements = statements
+
+    def __getstate__(self):
+        return tuple(getattr(self, x) for x in self.__slots__)
+
+    def __setstate__(self, state):
+        for key, value in zip(self.__slots__, state):
+            setattr(self, key, value)
+
+    def materialize(self, repo):
+        """Build the pywikibot based wd_item used by the Uploader."""
+        wdstuff = interning.get_wdstuff(repo)
+        wd_item = {
+            "upload": self.upload,
+            "wd-item": None if self.qid is None else "Q{}".format(self.qid),
+            "labels": [{"language": lang, "value": text}
+                       for lang, text in self.labels],
+            "descriptions": [{"language": lang, "value": text}
+                             for lang, text in self.descriptions],
+            "statements": []}
+        for record in self.statements:
+            statement = wdstuff.Statement(decode_value(record.value, repo),
+                                          special=record.value[0] == SPECIAL)
+            for pid, value in record.quals:
+                statement.addQualifier(wdstuff.Qualifier(
+                    encode_pid(pid), decode_value(value, repo)))
+            wd_item["statements"].append(
+                {"prop": encode_pid(record.pid),
+                 "value": statement,
+                 "ref": decode_reference(record.ref, repo)})
+        return UploadItem(self.raw_data, wd_item)
+
+
+def decode_pid(prop):
+    return int(prop[1:])
+
+
+def encode_pid(pid):
+    return "P{}".format(pid)
+
+
+def encode_value(value):
+    """Turn a WikidataItem.add_statement value into a value tuple."""
+    if isinstance(value, list) and len(value) == 1:
+        value = value[0]
+    if utils.string_is_q_item(value):
+        return (ITEM, int(value[1:]))
+    elif value in ("novalue", "somevalue"):
+        return (SPECIAL, value)
+    elif isinstance(value, dict) and 'quantity_value' in value:
+        unit = value.get("unit")
+        return (QUANTITY, value["quantity_value"],
+                int(unit[1:]) if unit else None)
+    elif isinstance(value, dict) and 'date_value' in value:
+        date_dict = value["date_value"]
+        return (TIME, date_dict.get("year"), date_dict.get("month"),
+                date_dict.get("day"))
+    return (STRING, value)
+
+
+def decode_value(value, repo):
+    """Turn a value tuple into a pywikibot claim target."""
+    kind = value[0]
+    if kind == ITEM:
+        return interning.get_item_page(repo, "Q{}".format(value[1]))
+    elif kind == TIME:
+        return interning.get_wb_time(*value[1:])
+    elif kind == QUANTITY:
+        unit = None
+        if value[2] is not None:
+            unit = interning.get_item_page(repo, "Q{}".format(value[2]))
+        return pywikibot.WbQuantity(amount=value[1], unit=unit, site=repo)
+    return value[1]
+
+
+def decode_reference(ref, repo):
+    """Turn a (test snaks, notest snaks) tuple into a Reference."""
+    if ref is None:
+        return None
+    wdstuff = interning.get_wdstuff(repo)
+    source_test, source_notest = (
+        [wdstuff.make_simple_claim(encode_pid(pid),
+                                   decode_value(value, repo))
+         for pid, value in snaks]
+        for snaks in ref)
+    return wdstuff.Reference(source_test=source_test,
+                             source_notest=source_notest)
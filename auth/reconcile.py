@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Match authority records without P4357 to existing Wikidata humans.
+
+Candidates come from a local snapshot (see dump_reader.write_humans)
+and are grouped into blocks by normalised surname + birth year and by
+normalised full name. A record is only scored against the candidates
+sharing one of its blocks, which keeps the work linear in the number
+of records. Every match made is logged, with its score, to a json
+lines file for review.
+"""
+import json
+import re
+import unicodedata
+
+# minimum score for a match, and how far ahead of the runner-up it must be
+THRESHOLD = 2.0
+MARGIN = 0.5
+MATCH_LOG = "reconciled.jsonl"
+
+
+def normalise(name):
+    """Lowercase, drop accents (but not åäö) and punctuation."""
+    name = unicodedata.normalize("NFC", name).casefold()
+    kept = []
+    for char in unicodedata.normalize("NFD", name):
+        if unicodedata.combining(char) and kept and \
+                unicodedata.normalize("NFC", kept[-1] + char) in "åäö":
+            kept[-1] = unicodedata.normalize("NFC", kept[-1] + char)
+        elif not unicodedata.combining(char):
+            kept.append(char)
+    name = re.sub(r"[^\w ]", " ", "".join(kept))
+    return " ".join(name.split())
+
+
+def surname_key(name):
+    """Block on the last word of a surname, as full names are split so."""
+    return name.split(" ")[-1]
+
+
+def get_year(date):
+    if date and date[:4].isdigit():
+        return int(date[:4])
+
+
+class Reconciler(object):
+
+    def __init__(self, candidates, log_file=MATCH_LOG):
+        """
+        :param candidates: iterable of dicts with qid, names (list),
+            birth and death (years or None)
+        :param log_file: json lines file the matches are appended to
+        """
+        self.log_file = log_file
+        self.candidates = []
+        self.by_surname_year = {}
+        self.by_full_name = {}
+        for candidate in candidates:
+            self.add_candidate(candidate)
+        print("Loaded {} reconciliation candidates.".format(
+            len(self.candidates)))
+
+    @classmethod
+    def from_file(cls, filename):
+        with open(filename) as f:
+            return cls(json.loads(line) for line in f)
+
+    def add_candidate(self, candidate):
+        index = len(self.candidates)
+        names = tuple(set(normalise(x) for x in candidate["names"] if x))
+        self.candidates.append(
+            (candidate["qid"], names, candidate.get("birth"),
+             candidate.get("death")))
+        for name in names:
+            self.by_full_name.setdefault(name, []).append(index)
+            if candidate.get("birth"):
+                key = (surname_key(name), candidate["birth"])
+                self.by_surname_year.setdefault(key, []).append(index)
+
+    def get_block(self, full_name, last, birth):
+        block = set(self.by_full_name.get(full_name, []))
+        if last and birth:
+            block.update(
+                self.by_surname_year.get((surname_key(last), birth), []))
+        return block
+
+    def score(self, candidate, full_name, first, birth, death):
+        """
+        Score how well a candidate fits a record.
+
+        Conflicting birth or death years rule the candidate out.
+        """
+        qid, names, c_birth, c_death = candidate
+        if birth and c_birth and abs(birth - c_birth) > 1:
+            return None
+        if death and c_death and abs(death - c_death) > 1:
+            return None
+        score = 0.0
+        if full_name in names:
+            score += 1.5
+        elif first:
+            given = set(x.split(" ")[0] for x in names)
+            score += 1.0 * len(given.intersection(first)) / len(first)
+        if birth and c_birth:
+            score += 1.0 if birth == c_birth else 0.5
+        if death and c_death:
+            score += 0.5 if death == c_death else 0.25
+        return score
+
+    def match(self, raw_data):
+        """
+        Find the Wikidata item of a person record, if confident.
+
+        :param raw_data: the clean data of a Person
+        :return: QID or None
+        """
+        full_name = normalise(raw_data.get("full_name", ""))
+        last = normalise(raw_data.get("last") or "")
+        first = [normalise(x) for x in raw_data.get("first") or []]
+        birth = get_year(raw_data.get("birth"))
+        death = get_year(raw_data.get("death"))
+        scored = []
+        for index in self.get_block(full_name, last, birth):
+            candidate = self.candidates[index]
+            score = self.score(candidate, full_name, first, birth, death)
+            if score is not None:
+                scored.append((score, candidate[0]))
+        if not scored:
+            return None
+        scored.sort(reverse=True)
+        best_score, best_qid = scored[0]
+        if best_score < THRESHOLD:
+            return None
+        runner_up = scored[1][0] if len(scored) > 1 else None
+        if runner_up is not None and best_score - runner_up < MARGIN:
+            return None
+        self.log_match(raw_data, best_qid, best_score, runner_up)
+        return best_qid
+
+    def log_match(self, raw_data, qid, score, runner_up):
+        """Append a match to the log, one line per write."""
+        entry = {"id_no": raw_data.get("id_no"),
+                 "full_name": raw_data.get("full_name"),
+                 "birth": raw_data.get("birth"),
+                 "death": raw_data.get("death"),
+                 "qid": qid,
+                 "score": score,
+                 "runner_up": runner_up}
+        with open(self.log_file, 'a') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import bz2
+import json
+
+import dump_reader
+
+
+def entity(qid, label, instance_of=(), claims=None):
+    claims = dict(claims or {})
+    claims["P31"] = [item_claim(x) for x in instance_of]
+    return {"id": qid, "labels": {"sv": {"language": "sv", "value": label}},
+            "claims": claims}
+
+
+def item_claim(qid):
+    return {"mainsnak": {"datavalue": {"value": {"id": qid}}}}
+
+
+def string_claim(value):
+    return {"mainsnak": {"datavalue": {"value": value}}}
+
+
+ENTITIES = [
+    entity("Q1", "Anna Svensson", ["Q5"], {"P4357": [string_claim("abc")]}),
+    entity("Q2", "Anna", ["Q202444"]),
+    entity("Q3", "Anna", ["Q12308941"]),
+    entity("Q4", "Svensson", ["Q101352"]),
+    entity("Q5", "Skådespelare", ["Q28640"]),
+    entity("Q6", "Stockholm", ["Q515"]),
+]
+
+
+def compact(value):
+    """Serialise like the dumps, the markers depend on it."""
+    return json.dumps(value, separators=(",", ":"))
+
+
+def write_dump(filename, lines):
+    with bz2.open(filename, "wb") as f:
+        f.write(b"[\n")
+        for line in lines:
+            f.write(line.encode("utf-8") + b",\n")
+        f.write(b"]\n")
+
+
+def test_only_marked_lines_are_decoded(tmp_path):
+    filename = str(tmp_path / "dump.json.bz2")
+    # not json, so decoding it would fail
+    write_dump(filename, [compact(x) for x in ENTITIES] +
+               ["{no marker in this line"])
+    qids = [x["id"] for x in dump_reader.iter_entities(filename)]
+    assert qids == ["Q1", "Q2", "Q3", "Q4", "Q5"]
+
+
+def test_required_markers(tmp_path):
+    filename = str(tmp_path / "dump.json.bz2")
+    write_dump(filename, [compact(x) for x in ENTITIES])
+    entities = dump_reader.iter_entities(
+        filename, [b'"id":"Q202444"', b'"id":"Q101352"'], [b'"Svensson"'])
+    assert [x["id"] for x in entities] == ["Q4"]
+
+
+def test_read_dump(tmp_path):
+    filename = str(tmp_path / "dump.json.bz2")
+    write_dump(filename, [compact(x) for x in ENTITIES])
+    data = dump_reader.read_dump(filename)
+    assert data["existing"] == {"abc": "Q1"}
+    assert data["first"] == {"Anna": ("Q2", 2)}
+    assert data["last"] == {"Svensson": ("Q4", 1)}
+    assert data["professions"] == {"skådespelare": "Q5"}
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+pytest.importorskip("pywikibot")
+pytest.importorskip("wikidataStuff")
+
+import existing_items  # noqa: E402
+
+VALUES = ["", "-1", "0", "09", "5a", "A", "Zz", "a", "abc", "z", "zz", "~"]
+
+
+def in_range(value, bounds):
+    lower, upper = bounds
+    return (lower is None or value >= lower) and \
+        (upper is None or value < upper)
+
+
+@pytest.mark.parametrize("prefix, upper, chars", [
+    ("", None, existing_items.RANGE_BOUNDS),
+    ("", "0", existing_items.SPLIT_BOUNDS),
+    ("a", "b", existing_items.SPLIT_BOUNDS),
+    ("z", None, existing_items.SPLIT_BOUNDS)])
+def test_ranges_cover_each_value_once(prefix, upper, chars):
+    ranges = existing_items.make_ranges(prefix, upper, chars)
+    for value in VALUES:
+        if value >= prefix and (upper is None or value < upper):
+            assert sum(in_range(value, x) for x in ranges) == 1, value
+        else:
+            assert not any(in_range(value, x) for x in ranges), value
+
+
+class FakeWdqs(object):
+
+    def __init__(self):
+        self.items = {"a": "Q1", "b": "Q2"}
+        self.queries = []
+
+    def all_items(self, prop):
+        self.queries.append("all")
+        return dict(self.items)
+
+    def changed_items(self, prop, since):
+        self.queries.append(since)
+        return {"c": "Q3"}
+
+
+@pytest.fixture
+def wdqs(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    wdqs = FakeWdqs()
+    monkeypatch.setattr(existing_items, "get_wd_items_using_prop",
+                        wdqs.all_items)
+    monkeypatch.setattr(existing_items, "get_changed_items_using_prop",
+                        wdqs.changed_items)
+    return wdqs
+
+
+def test_cache_is_refreshed_incrementally(wdqs):
+    assert existing_items.get_existing_items("P4357") == \
+        {"a": "Q1", "b": "Q2"}
+    timestamp = existing_items.load_cache("P4357")["timestamp"]
+    assert existing_items.get_existing_items("P4357") == \
+        {"a": "Q1", "b": "Q2", "c": "Q3"}
+    assert wdqs.queries == ["all", timestamp]
+
+
+def test_offline_only_reads_the_cache(wdqs):
+    assert existing_items.get_existing_items("P4357", offline=True) == {}
+    existing_items.get_existing_items("P4357")
+    assert existing_items.get_existing_items("P4357", offline=True) == \
+        {"a": "Q1", "b": "Q2"}
+    assert wdqs.queries == ["all"]
+
+
+def test_refresh_downloads_everything(wdqs):
+    existing_items.get_existing_items("P4357")
+    existing_items.get_existing_items("P4357", refresh=True)
+    assert wdqs.queries == ["all", "all"]
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+pytest.importorskip("pywikibot")
+pytest.importorskip("wikidataStuff")
+pytest.importorskip("batchupload")
+
+from Journal import Journal  # noqa: E402
+import auth_importer  # noqa: E402
+
+RECORDS = [{"P1": {}}, {"P2": {}}, {"P3": {}}, {"P4": {}}]
+
+
+@pytest.fixture
+def journal(tmp_path):
+    filename = str(tmp_path / "journal.jsonl")
+    journal = Journal(filename)
+    journal.record("P1", "created", "Q1")
+    journal.record("P2", Journal.FAILED, "Q2", reason="edit conflict")
+    journal.record("P3", Journal.FAILED, reason="timeout")
+    journal.record("P3", "updated", "Q3")
+    return Journal(filename)
+
+
+def kept(journal, resume, retry_failed):
+    return [auth_importer.get_id_no(p) for p in
+            auth_importer.filter_journaled(RECORDS, journal, resume,
+                                           retry_failed)]
+
+
+def test_last_entry_wins(journal):
+    assert journal.is_done("P1")
+    assert journal.is_failed("P2")
+    assert journal.is_done("P3")
+    assert not journal.is_done("P4") and not journal.is_failed("P4")
+
+
+def test_failed_qid_is_remembered(journal):
+    assert journal.get_failed_qid("P2") == "Q2"
+    assert journal.get_failed_qid("P1") is None
+
+
+def test_cut_off_line_is_ignored(journal):
+    with open(journal.filename, 'a') as f:
+        f.write('{"id_no": "P4", "stat')
+    assert Journal(journal.filename).entries.keys() == {"P1", "P2", "P3"}
+
+
+def test_filter(journal):
+    assert kept(journal, False, False) == ["P1", "P2", "P3", "P4"]
+    assert kept(journal, True, False) == ["P2", "P4"]
+    assert kept(journal, False, True) == ["P2"]
+    assert kept(journal, True, True) == ["P2"]
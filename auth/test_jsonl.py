@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from array import array
+import os
+
+import pytest
+
+pytest.importorskip("batchupload")
+
+import utils  # noqa: E402
+
+ENTRIES = [{"P{}".format(i): {"name": "Åsa {}".format(i)}} for i in range(7)]
+
+
+@pytest.fixture
+def jsonl_file(tmp_path):
+    filename = str(tmp_path / "authority.jsonl")
+    utils.jsonl_to_file(filename, ENTRIES)
+    return filename
+
+
+def test_index_holds_line_offsets(jsonl_file):
+    offsets = array("Q")
+    with open(utils.index_filename(jsonl_file), 'rb') as f:
+        offsets.frombytes(f.read())
+    with open(jsonl_file, 'rb') as f:
+        content = f.read()
+    starts = [0] + [i + 1 for i, byte in enumerate(content[:-1])
+                    if byte == ord("\n")]
+    assert list(offsets) == starts
+
+
+@pytest.mark.parametrize("offset, limit", [
+    (0, None), (3, None), (3, 2), (6, 5), (7, None), (10, 1), (0, 0)])
+def test_iter_jsonl(jsonl_file, offset, limit):
+    expected = ENTRIES[offset:]
+    if limit is not None:
+        expected = expected[:limit]
+    assert list(utils.iter_jsonl(jsonl_file, offset, limit)) == expected
+
+
+def test_iter_jsonl_without_index(jsonl_file):
+    os.remove(utils.index_filename(jsonl_file))
+    assert list(utils.iter_jsonl(jsonl_file, 4, 2)) == ENTRIES[4:6]
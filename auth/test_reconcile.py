@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from reconcile import Reconciler, normalise
+
+CANDIDATES = [
+    {"qid": "Q1", "names": ["Anna von Essen"], "birth": 1850,
+     "death": 1901},
+    {"qid": "Q2", "names": ["Anna Essén", "Anna Lind"], "birth": 1870,
+     "death": None},
+    {"qid": "Q3", "names": ["Karl Berg"], "birth": 1850, "death": 1920},
+    {"qid": "Q4", "names": ["Karl Berg"], "birth": 1850, "death": None},
+]
+
+
+@pytest.fixture
+def reconciler(tmp_path):
+    return Reconciler(CANDIDATES, str(tmp_path / "reconciled.jsonl"))
+
+
+def record(full_name, first, last, birth=None, death=None):
+    return {"id_no": "P1", "full_name": full_name, "first": first,
+            "last": last, "birth": birth, "death": death}
+
+
+def logged(reconciler):
+    with open(reconciler.log_file) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_normalise():
+    assert normalise("Anna  Essén-Åberg") == "anna essen åberg"
+
+
+def test_surname_block_uses_last_word_on_both_sides(reconciler):
+    # the record has the full surname, the candidate a full name
+    block = reconciler.get_block("anna e", "von essen", 1850)
+    assert block == {0}
+
+
+def test_full_name_block(reconciler):
+    assert reconciler.get_block("anna lind", "", None) == {1}
+
+
+def test_only_the_block_is_scored(reconciler, monkeypatch):
+    scored = []
+    score = reconciler.score
+
+    def spy(candidate, *args):
+        scored.append(candidate[0])
+        return score(candidate, *args)
+    monkeypatch.setattr(reconciler, "score", spy)
+    reconciler.match(record("Anna von Essen", ["Anna"], "von Essen",
+                            "1850-03-02", "1901"))
+    assert scored == ["Q1"]
+
+
+def test_match_is_logged(reconciler):
+    qid = reconciler.match(record("Anna von Essen", ["Anna"], "von Essen",
+                                  "1850-03-02", "1901"))
+    assert qid == "Q1"
+    entry, = logged(reconciler)
+    assert entry["qid"] == "Q1" and entry["score"] >= 2.0
+    assert entry["runner_up"] is None
+
+
+def test_ambiguous_match_is_refused(reconciler, tmp_path):
+    qid = reconciler.match(record("Karl Berg", ["Karl"], "Berg", "1850"))
+    assert qid is None
+    assert not (tmp_path / "reconciled.jsonl").exists()
+
+
+def test_conflicting_years_rule_out(reconciler):
+    assert reconciler.match(
+        record("Anna von Essen", ["Anna"], "von Essen", "1860")) is None
@@ -1,25 +1,16 @@
 #!/usr/bin/python
 # -*- coding: utf-8  -*-
+from array import array
+import json
+import os
+
 import batchupload.helpers as helpers
 
+from shared import entities
 
-def character_cleanup(txt):
-    glossary = {
-        "&Aacute;": "Á",
-        "&aacute;": "á",
-        "&Aring;": "Å",
-        "&Auml;": "Ä",
-        "&auml;": "ä",
-        "&apos;": "'",
-        "&eacute;": "é",
-        "&egrave;": "è",
-        "&Egrave;": "È",
-        "&oacute;": "ó",
-        "&uuml;": "ü",
-    }
-    for key in glossary.keys():
-        txt = txt.replace(key, glossary[key])
-    return txt
+# the entity decoding is shared with the other script directory
+character_cleanup = entities.character_cleanup
+CleanupReader = entities.CleanupReader
 
 
 def clean_name(name_string):
@@ -31,3 +22,65 @@ def clean_name(name_string):
     else:
         good_name = helpers.flip_name(name_string.split("(")[0].strip())
     return good_name
+
+
+def index_filename(filename):
+    """Get the name of the byte offset index belonging to a jsonl file."""
+    return filename + ".idx"
+
+
+def jsonl_to_file(filename, entries):
+    """
+    Write entries as JSON Lines, together with a byte offset index.
+
+    The index is a flat array of unsigned 64 bit integers where
+    position n holds the byte offset of line n, which lets a reader
+    seek straight to any entry.
+
+    :param filename: name of the jsonl file
+    :param entries: iterable of json serializable objects
+    """
+    offsets = array("Q")
+    with open(filename, 'wb') as f:
+        for entry in entries:
+            offsets.append(f.tell())
+            line = json.dumps(entry, sort_keys=True, ensure_ascii=False)
+            f.write(line.encode("utf-8") + b"\n")
+    with open(index_filename(filename), 'wb') as f:
+        offsets.tofile(f)
+
+
+def iter_jsonl(filename, offset=0, limit=None):
+    """
+    Stream entries from a JSON Lines file.
+
+    If the file has an offset index, the reader seeks directly
+    to the first wanted entry instead of parsing its way there.
+
+    :param filename: name of the jsonl file
+    :param offset: number of entries to skip
+    :param limit: maximum number of entries to return
+    """
+    start = 0
+    skip = offset or 0
+    index = index_filename(filename)
+    if skip and os.path.exists(index):
+        item_size = array("Q").itemsize
+        with open(index, 'rb') as f:
+            f.seek(skip * item_size)
+            raw = f.read(item_size)
+        if len(raw) < item_size:
+            return
+        start = array("Q", raw)[0]
+        skip = 0
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        count = 0
+        for line in f:
+            if skip:
+                skip -= 1
+                continue
+            if limit is not None and count >= limit:
+                break
+            yield json.loads(line.decode("utf-8"))
+            count += 1
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Cache of which categories exist on Commons.
+
+Unknown categories are looked up 50 titles per API request. Both
+existing and missing categories are remembered, and the cache is kept
+on disk between runs for TTL seconds.
+"""
+import json
+import os
+import time
+
+import pywikibot
+
+CACHE_FILE = "category_cache.json"
+TTL = 7 * 24 * 3600
+BATCH_SIZE = 50
+
+
+def with_prefix(cat):
+    if not cat.lower().startswith('category:'):
+        cat = 'Category:{0}'.format(cat)
+    return cat
+
+
+class CategoryCache(object):
+
+    def __init__(self, site, cache_file=CACHE_FILE, ttl=TTL):
+        self.site = site
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.entries = {}  # title -> [exists, timestamp]
+        self.requests = 0
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        with open(self.cache_file, encoding="utf-8") as f:
+            entries = json.load(f)
+        oldest = time.time() - self.ttl
+        self.entries = {title: entry for title, entry in entries.items()
+                        if entry[1] >= oldest}
+
+    def save(self):
+        with open(self.cache_file, 'w', encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+
+    def query(self, titles):
+        """Look up a batch of at most BATCH_SIZE titles."""
+        request = pywikibot.data.api.Request(
+            site=self.site,
+            parameters={"action": "query", "titles": "|".join(titles)})
+        result = request.submit()
+        self.requests += 1
+        query = result.get("query", {})
+        normalized = {x["from"]: x["to"] for x in query.get("normalized", [])}
+        exists = {page["title"]: "missing" not in page and
+                  "invalid" not in page
+                  for page in query.get("pages", {}).values()}
+        now = time.time()
+        for title in titles:
+            found = exists.get(normalized.get(title, title), False)
+            self.entries[title] = [found, now]
+
+    def prefetch(self, cats):
+        """Look up all categories not already in the cache."""
+        unknown = sorted({with_prefix(cat) for cat in cats} -
+                         set(self.entries))
+        for i in range(0, len(unknown), BATCH_SIZE):
+            self.query(unknown[i:i + BATCH_SIZE])
+        if unknown:
+            pywikibot.output(
+                "Looked up {} categories in {} requests.".format(
+                    len(unknown), self.requests))
+
+    def exists(self, cat):
+        cat = with_prefix(cat)
+        if cat not in self.entries:
+            self.query([cat])
+        return self.entries[cat][0]
@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Memoised category rules.
+
+A category rule is a generate_*_cat method of an item, adding to its
+content_cats and meta_cats. Many items share the values a rule looks
+at, so each rule is run once per distinct key and the categories it
+added are reused for every other item with the same key.
+"""
+from collections import Counter
+
+import pywikibot
+
+
+class DerivationCache(object):
+
+    def __init__(self):
+        self.results = {}  # rule name -> {key: (content cats, meta cats)}
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def run_rule(self, item, rule):
+        """Run a rule on its own, returning the categories it added."""
+        saved = item.content_cats, item.meta_cats
+        item.content_cats, item.meta_cats = set(), set()
+        try:
+            rule()
+            return frozenset(item.content_cats), frozenset(item.meta_cats)
+        finally:
+            item.content_cats, item.meta_cats = saved
+
+    def apply(self, item, rule, key):
+        """
+        Add the categories of a rule to an item.
+
+        :param rule: bound generate_*_cat method of the item
+        :param key: hashable value of everything the rule depends on
+        """
+        results = self.results.setdefault(rule.__name__, {})
+        if key in results:
+            self.hits[rule.__name__] += 1
+        else:
+            self.misses[rule.__name__] += 1
+            results[key] = self.run_rule(item, rule)
+        content_cats, meta_cats = results[key]
+        item.content_cats.update(content_cats)
+        item.meta_cats.update(meta_cats)
+
+    def stats(self):
+        """Get rule name -> (hits, misses)."""
+        return {name: (self.hits[name], self.misses[name])
+                for name in set(self.hits) | set(self.misses)}
+
+    def report(self):
+        for name, (hits, misses) in sorted(self.stats().items()):
+            pywikibot.output("{}: {} hits, {} misses".format(
+                name, hits, misses))
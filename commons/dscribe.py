@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Streaming reader for DScribe (CalmView) xml exports.
+
+Records are streamed one at a time by shards.iter_records and walked
+once, collecting the text of every tag of interest, so memory use does
+not depend on the size of the export.
+"""
+from shared import shards
+import utils
+
+
+def extract(record, tag_map):
+    """
+    Collect the text of all tags of interest in a record.
+
+    :param tag_map: dict of key -> xml tag
+    :return: dict of key -> list with the text of every occurrence of
+        the tag, in document order. The text is None for elements
+        without leading text, as firstChild.nodeValue would be.
+    """
+    keys_by_tag = {}
+    for key, tag in tag_map.items():
+        keys_by_tag.setdefault(tag, []).append(key)
+    content = {key: [] for key in tag_map}
+    for elem in record.iter():
+        if elem is record:
+            continue
+        for key in keys_by_tag.get(elem.tag, []):
+            content[key].append(elem.text)
+    return content
+
+
+def iter_record_dicts(in_file, tag_map, workers=None):
+    """
+    Yield the extracted content of every record in a file.
+
+    :param workers: if more than one, split the file into shards
+        parsed in that many processes, the order is kept
+    """
+    if workers and workers > 1:
+        for content in shards.parse_shards(in_file, parse_shard, workers,
+                                           tag_map):
+            yield content
+        return
+    with open(in_file, encoding="utf-8") as f:
+        for record in shards.iter_records(utils.CleanupReader(f)):
+            yield extract(record, tag_map)
+
+
+def parse_shard(in_file, start, end, tag_map):
+    """Extract the content of all records in a byte range of a file."""
+    with open(in_file, 'rb') as f:
+        source = utils.CleanupReader(shards.ShardReader(f, start, end))
+        return [extract(record, tag_map)
+                for record in shards.iter_records(source)]
+
+
+def pop_workers_arg(args):
+    """
+    Take the -workers:N argument out of the command line arguments.
+
+    :return: (number of workers or None, remaining arguments)
+    """
+    workers = None
+    remaining = []
+    for arg in args:
+        option, sep, value = arg.partition(':')
+        if option == '-workers':
+            workers = int(value)
+        else:
+            remaining.append(arg)
+    return workers, remaining
+
+
+def first_text(values):
+    """
+    Get the stripped first value of a tag, as the minidom parsers did.
+
+    :raises IndexError: if the tag is missing
+    :raises AttributeError: if the element has no leading text
+    """
+    return values[0].strip()
@@ -2,10 +2,9 @@
 # -*- coding: utf-8  -*-
 import argparse
 from collections import Counter
-from xml.dom.minidom import parseString
 import batchupload.common as common
 import batchupload.helpers as helpers
-import utils
+import dscribe
 
 
 def create_wikipage(items, typ):
@@ -24,19 +23,12 @@ def save_data(out_file, text):
     return common.open_and_write_file(out_file, text)
 
 
-def load_data(in_file):
-    return common.open_and_read_file(in_file, as_json=False)
-
-
-def get_items_by_tag(xml, tag):
+def get_items_by_tag(in_file, tag):
     items = []
-    dom = parseString(utils.character_cleanup(xml))
-    records = dom.getElementsByTagName("DScribeRecord")
-    for record in records:
+    for record in dscribe.iter_record_dicts(in_file, {"content": tag}):
         try:
-            content = record.getElementsByTagName(
-                tag)[0].firstChild.nodeValue
-        except (AttributeError, IndexError):
+            content = record["content"][0] or ""
+        except IndexError:
             content = ""
         if len(content) != 0:
             items.append(content.strip())
@@ -49,8 +41,7 @@ def create_filename(field):
 
 
 def main(arguments):
-    raw_xml = load_data(arguments.in_file)
-    items = get_items_by_tag(raw_xml, arguments.field)
+    items = get_items_by_tag(arguments.in_file, arguments.field)
     wikitable = create_wikipage(items, arguments.typ)
     filename = create_filename(arguments.field)
     save_data(filename, wikitable)
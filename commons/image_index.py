@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Index of an image directory, built once per run.
+
+Replaces scanning the whole directory for every item when looking up
+the original filename of an image.
+"""
+from bisect import bisect_left
+from os import listdir
+
+index_cache = {}
+
+
+class PrefixIndex(object):
+    """
+    Find the files whose name starts with an id.
+
+    Like the old listdir scans, the last match in listdir order wins.
+    """
+
+    def __init__(self, path):
+        self.names = listdir(path)
+        self.sorted_names = sorted(self.names)
+        self.positions = {name: i for i, name in enumerate(self.names)}
+
+    def last_match(self, prefix):
+        """Get the last file in listdir order starting with prefix."""
+        best = None
+        i = bisect_left(self.sorted_names, prefix)
+        while i < len(self.sorted_names) and \
+                self.sorted_names[i].startswith(prefix):
+            name = self.sorted_names[i]
+            if best is None or self.positions[name] > self.positions[best]:
+                best = name
+            i += 1
+        return best
+
+
+class StereoIndex(object):
+    """
+    Find stereo card images by id and side.
+
+    The files are named <id>_..._<a or b>.<ext>, the key is
+    (id, side) and the last file in listdir order wins.
+    """
+
+    def __init__(self, path):
+        self.names = listdir(path)
+        self.files = {}
+        for fname in self.names:
+            self.files[self.key(fname)] = fname.split(".")[0]
+
+    @staticmethod
+    def key(fname):
+        stem = fname.split(".")[0]
+        return stem.split("_")[0], stem[-1:]
+
+    def get(self, image_id, side):
+        return self.files.get((image_id, side))
+
+
+def get_index(path, index_class=PrefixIndex):
+    """Get the index of a directory, building it on first use."""
+    key = (path, index_class)
+    if key not in index_cache:
+        index_cache[key] = index_class(path)
+    return index_cache[key]
+
+
+def report_unmatched(names, file_key, records, has_file):
+    """
+    Print the files without a record and the records without a file.
+
+    :param names: filenames in the image directory
+    :param file_key: function giving the record key of a filename
+    :param records: dict of record key -> item
+    :param has_file: function telling if an item has an image
+    """
+    for fname in names:
+        if file_key(fname) not in records:
+            print("File exists, no xml entry:", fname)
+    for key, item in records.items():
+        if not has_file(item):
+            print("Xml entry exists, no file:", key)
@@ -5,15 +5,18 @@ Construct templates and categories for Helleday data.
 """
 from collections import OrderedDict
 import os.path
-from os import listdir
 
-from xml.dom.minidom import parseString
 import pywikibot
 
-import batchupload.listscraper as listscraper
 import batchupload.common as common
 import batchupload.helpers as helpers
 from batchupload.make_info import MakeBaseInfo
+import category_cache
+import derivation
+import dscribe
+import image_index
+import mapping_revisions
+import render_pool
 import utils
 
 MAPPINGS_DIR = 'mappings'
@@ -27,33 +30,53 @@ LOGFILE = "glasnegativ.log"
 class GlassInfo(MakeBaseInfo):
 
     def category_exists(self, cat):
-        if not cat.lower().startswith('category:'):
-            cat = 'Category:{0}'.format(cat)
+        return self.category_cache.exists(cat)
 
-        if cat in self.category_cache:
-            return cat
-
-        exists = pywikibot.Page(self.commons, cat).exists()
-        if exists:
-            self.category_cache.append(cat)
-        return exists
+    @classmethod
+    def handle_args(cls, args, *other):
+        """Add -workers:N, to parse and render in that many processes."""
+        workers, args = dscribe.pop_workers_arg(args)
+        options = super(GlassInfo, cls).handle_args(args, *other)
+        options['workers'] = workers
+        return options
 
     def __init__(self, **options):
+        self.workers = options.pop('workers', None)
         super(GlassInfo, self).__init__(**options)
         self.batch_cat = "{}: {}".format(BATCH_CAT, BATCH_DATE)
         self.commons = pywikibot.Site('commons', 'commons')
         self.wikidata = pywikibot.Site('wikidata', 'wikidata')
         self.log = common.LogFile('', LOGFILE)
-        self.category_cache = []
+        self.category_cache = category_cache.CategoryCache(self.commons)
+        self.derivations = derivation.DerivationCache()
 
     def load_data(self, in_file):
-        return common.open_and_read_file(in_file, as_json=False)
+        # the file is streamed record by record in process_data
+        return in_file
+
+    def make_info(self):
+        # look up all tentative categories in batches before they are used
+        self.category_cache.prefetch(
+            cat for item in self.data.values()
+            for cat in item.get_tentative_cats())
+        try:
+            if self.workers and self.workers > 1:
+                return render_pool.render_in_pool(
+                    self, super(GlassInfo, self).make_info, self.workers)
+            return super(GlassInfo, self).make_info()
+        finally:
+            self.category_cache.save()
+            self.derivations.report()
 
     def generate_content_cats(self, item):
-        item.generate_depicted_cat()
-        item.generate_yearly_cat()
-        item.generate_image_type_cats()
-        item.generate_creator_cat()
+        # each rule is only run once per distinct value it depends on
+        apply = self.derivations.apply
+        apply(item, item.generate_depicted_cat,
+              (tuple(item.depicted), item.gender))
+        apply(item, item.generate_yearly_cat, item.image_date)
+        apply(item, item.generate_image_type_cats,
+              (item.image_type, item.gender))
+        apply(item, item.generate_creator_cat, item.creator)
         item.content_cats.add("Glass plate negatives in the Swedish Performing Arts Agency")
         return list(item.content_cats)
 
@@ -74,28 +97,17 @@ class GlassInfo(MakeBaseInfo):
         depicted_page = 'User:Alicia_Fagerving_(WMSE)/sandbox_gn_depicted'
         if update_mappings:
             print("Updating mappings...")
-            self.mappings['depicted'] = self.get_depicted_mapping(
-                depicted_page)
-            common.open_and_write_file(
-                depicted_file, self.mappings['depicted'], as_json=True)
+            revisions = mapping_revisions.get_latest_revisions(
+                self.commons, [depicted_page])
+            self.mappings['depicted'] = mapping_revisions.refresh_mapping(
+                self.commons, depicted_file, depicted_page,
+                revisions.get(depicted_page), self.parse_depicted_rows, dict)
         else:
-            self.mappings['depicted'] = common.open_and_read_file(
-                depicted_file, as_json=True)
+            self.mappings['depicted'] = utils.load_mapping(depicted_file)
         pywikibot.output('Loaded all mappings')
 
-    def get_depicted_mapping(self, play_page):
-        theatres = {}
-        page = pywikibot.Page(self.commons, play_page)
-        data = listscraper.parseEntries(
-            page.text,
-            row_t='User:André Costa (WMSE)/mapping-row',
-            default_params={'name': '', 'category': '', 'frequency': ''})
-        for entry in data:
-            if entry['category'] and entry['name']:
-                category = entry['category'][0]
-                name = entry['name'][0]
-                theatres[name] = category
-        return theatres
+    def parse_depicted_rows(self, text):
+        return mapping_revisions.parse_mapping_rows(text, 'category')
 
     def make_info_template(self, item):
         template_name = 'Musikverket-image'
@@ -113,17 +125,13 @@ class GlassInfo(MakeBaseInfo):
 
     def get_original_filename(self, item):
         filename = None
-        path = IMAGE_DIR
-        image_id = item.id_no
-        for fname in listdir(path):
-            if fname.startswith(image_id):
-                filename = fname[:-4]
+        fname = image_index.get_index(IMAGE_DIR).last_match(item.id_no)
+        if fname is not None:
+            filename = fname[:-4]
         return filename
 
-    def process_data(self, raw_data):
+    def process_data(self, in_file):
         d = {}
-        dom = parseString(utils.character_cleanup(raw_data))
-        records = dom.getElementsByTagName("DScribeRecord")
         tagDict = {
             'image_title': 'Title',
             'id_no': 'RefNo',
@@ -138,33 +146,32 @@ class GlassInfo(MakeBaseInfo):
             'keywords': 'Keyword',
             'image_type': 'UserWrapped2',
         }
-        for record in records:
+        for record in dscribe.iter_record_dicts(in_file, tagDict,
+                                                self.workers):
             rec_dic = {}
             for tag in tagDict:
-                xml_tag = tagDict[tag]
                 try:
                     if tag == "description":
                         descriptions = {}
-                        nodes = record.getElementsByTagName(xml_tag)
-                        swedish = nodes[0].firstChild.nodeValue.strip()
-                        english = nodes[1].firstChild.nodeValue.strip()
+                        nodes = record[tag]
+                        swedish = dscribe.first_text(nodes)
+                        english = dscribe.first_text(nodes[1:])
                         descriptions["sv"] = swedish
                         descriptions["en"] = english
                         content = descriptions
                     elif tag == "depicted":
                         depicted = []
-                        nodes = record.getElementsByTagName(xml_tag)
-                        for node in nodes:
-                            depicted.append(node.firstChild.nodeValue.strip())
+                        for node in record[tag]:
+                            depicted.append(node.strip())
                         content = depicted
                     else:
-                        content = record.getElementsByTagName(
-                            xml_tag)[0].firstChild.nodeValue.strip()
+                        content = dscribe.first_text(record[tag])
                 except (AttributeError, IndexError):
                     content = ""
                 rec_dic[tag] = content
             id_no = rec_dic["id_no"]
             d[id_no] = GlassItem(rec_dic, self)
+        utils.add_std_dates(d.values())
         self.data = d
 
 
@@ -196,10 +203,7 @@ class GlassItem(object):
         return "{}\n{}".format(english, swedish)
 
     def generate_date(self):
-        date = None
-        if self.image_date:
-            date = helpers.stdDate(self.image_date)
-        return date
+        return self.std_date
 
     def generate_license(self):
         template = "{{PD-old-70}}"
@@ -221,13 +225,11 @@ class GlassItem(object):
         library = "Musik- och teaterbiblioteket"
         return "{}, {}".format(library, self.collection)
 
-    def generate_yearly_cat(self):
+    def get_tentative_yearly_cats(self):
         base = "{} portrait photographs"
-        tentative = base.format(self.image_date)
-        if self.glass_info.category_exists(tentative):
-            self.content_cats.add(tentative)
+        return [base.format(self.image_date)]
 
-    def generate_image_type_cats(self):
+    def get_tentative_image_type_cats(self):
         tentative = []
         img_type = self.image_type.lower()
         if self.gender.lower() == "kvinna":
@@ -238,7 +240,20 @@ class GlassItem(object):
             tentative.append("Portrait photographs of {}".format(gender))
         if img_type == "rollporträtt":
             tentative.append("Theatrical costume in portraits")
-        for t in tentative:
+        return tentative
+
+    def get_tentative_cats(self):
+        """Get the categories only added if they exist."""
+        return (self.get_tentative_yearly_cats() +
+                self.get_tentative_image_type_cats())
+
+    def generate_yearly_cat(self):
+        for tentative in self.get_tentative_yearly_cats():
+            if self.glass_info.category_exists(tentative):
+                self.content_cats.add(tentative)
+
+    def generate_image_type_cats(self):
+        for t in self.get_tentative_image_type_cats():
             if self.glass_info.category_exists(t):
                 self.content_cats.add(t)
 
@@ -5,15 +5,17 @@ Construct templates and categories for Helleday data.
 """
 from collections import OrderedDict
 import os.path
-from os import listdir
 
 import pywikibot
 
-import batchupload.listscraper as listscraper
 import batchupload.common as common
 import batchupload.helpers as helpers
 from batchupload.make_info import MakeBaseInfo
 import re
+import category_cache
+from shared import dates
+import image_index
+import mapping_revisions
 import utils
 
 MAPPINGS_DIR = 'mappings'
@@ -27,16 +29,7 @@ LOGFILE = "glasnegativ_uncat_2.log"
 class GlassInfo(MakeBaseInfo):
 
     def category_exists(self, cat):
-        if not cat.lower().startswith('category:'):
-            cat = 'Category:{0}'.format(cat)
-
-        if cat in self.category_cache:
-            return cat
-
-        exists = pywikibot.Page(self.commons, cat).exists()
-        if exists:
-            self.category_cache.append(cat)
-        return exists
+        return self.category_cache.exists(cat)
 
     def __init__(self, **options):
         super(GlassInfo, self).__init__(**options)
@@ -44,11 +37,21 @@ class GlassInfo(MakeBaseInfo):
         self.commons = pywikibot.Site('commons', 'commons')
         self.wikidata = pywikibot.Site('wikidata', 'wikidata')
         self.log = common.LogFile('', LOGFILE)
-        self.category_cache = []
+        self.category_cache = category_cache.CategoryCache(self.commons)
 
     def load_data(self, in_file):
         return common.open_and_read_file(in_file, as_json=False)
 
+    def make_info(self):
+        # look up all tentative categories in batches before they are used
+        self.category_cache.prefetch(
+            cat for item in self.data.values()
+            for cat in item.get_tentative_cats())
+        try:
+            return super(GlassInfo, self).make_info()
+        finally:
+            self.category_cache.save()
+
     def generate_content_cats(self, item):
         item.generate_depicted_cat()
         # item.generate_yearly_cat()
@@ -74,28 +77,17 @@ class GlassInfo(MakeBaseInfo):
         depicted_page = 'User:Alicia_Fagerving_(WMSE)/sandbox_gn_depicted'
         if update_mappings:
             print("Updating mappings...")
-            self.mappings['depicted'] = self.get_depicted_mapping(
-                depicted_page)
-            common.open_and_write_file(
-                depicted_file, self.mappings['depicted'], as_json=True)
+            revisions = mapping_revisions.get_latest_revisions(
+                self.commons, [depicted_page])
+            self.mappings['depicted'] = mapping_revisions.refresh_mapping(
+                self.commons, depicted_file, depicted_page,
+                revisions.get(depicted_page), self.parse_depicted_rows, dict)
         else:
-            self.mappings['depicted'] = common.open_and_read_file(
-                depicted_file, as_json=True)
+            self.mappings['depicted'] = utils.load_mapping(depicted_file)
         pywikibot.output('Loaded all mappings')
 
-    def get_depicted_mapping(self, play_page):
-        theatres = {}
-        page = pywikibot.Page(self.commons, play_page)
-        data = listscraper.parseEntries(
-            page.text,
-            row_t='User:André Costa (WMSE)/mapping-row',
-            default_params={'name': '', 'category': '', 'frequency': ''})
-        for entry in data:
-            if entry['category'] and entry['name']:
-                category = entry['category'][0]
-                name = entry['name'][0]
-                theatres[name] = category
-        return theatres
+    def parse_depicted_rows(self, text):
+        return mapping_revisions.parse_mapping_rows(text, 'category')
 
     def make_info_template(self, item):
         template_name = 'Musikverket-image'
@@ -115,11 +107,9 @@ class GlassInfo(MakeBaseInfo):
 
     def get_original_filename(self, item):
         filename = None
-        path = IMAGE_DIR
-        image_id = item.id_no
-        for fname in listdir(path):
-            if fname.startswith(image_id):
-                filename = fname[:-4]
+        fname = image_index.get_index(IMAGE_DIR).last_match(item.id_no)
+        if fname is not None:
+            filename = fname[:-4]
         return filename
 
     def process_data(self, raw_data):
@@ -155,7 +145,7 @@ class GlassItem(object):
     def generate_date(self):
         match = re.match(r'.*([1-3][0-9]{3})', self.image_title)
         if match is not None:
-            return helpers.stdDate(match.group(1))
+            return dates.std_date(match.group(1))
 
     def generate_license(self):
         template = "{{PD-old-70}}"
@@ -179,13 +169,11 @@ class GlassItem(object):
         library = "Musik- och teaterbiblioteket"
         return "{}, {}".format(library, "Glasnegativsamlingen")
 
-    def generate_yearly_cat(self):
+    def get_tentative_yearly_cats(self):
         base = "{} portrait photographs"
-        tentative = base.format(self.image_date)
-        if self.glass_info.category_exists(tentative):
-            self.content_cats.add(tentative)
+        return [base.format(self.image_date)]
 
-    def generate_image_type_cats(self):
+    def get_tentative_image_type_cats(self):
         tentative = []
         img_type = self.image_type.lower()
         if self.gender.lower() == "kvinna":
@@ -196,7 +184,15 @@ class GlassItem(object):
             tentative.append("Portrait photographs of {}".format(gender))
         if img_type == "rollporträtt":
             tentative.append("Theatrical costume in portraits")
-        for t in tentative:
+        return tentative
+
+    def generate_yearly_cat(self):
+        for tentative in self.get_tentative_yearly_cats():
+            if self.glass_info.category_exists(tentative):
+                self.content_cats.add(tentative)
+
+    def generate_image_type_cats(self):
+        for t in self.get_tentative_image_type_cats():
             if self.glass_info.category_exists(t):
                 self.content_cats.add(t)
 
@@ -207,21 +203,31 @@ class GlassItem(object):
         elif "a. blomberg" in c:
             self.content_cats.add("Anton Blomberg")
 
-    def generate_depicted_cat(self):
+    def get_tentative_depicted_cats(self):
+        """Get the names of the people in the title, as categories."""
         if "_as_" not in self.image_title:
             before_in = self.image_title.split("_in_")[0]
         else:
             before_in = self.image_title.split("_as_")[0]
         all_persons = before_in.split("_and_")
-        number_of_people = 0
-        added_cats = 0
+        names = []
         for p in all_persons:
             if len(p.split(",")[0].split("_")) > 1:
-                number_of_people = number_of_people + 1
-                name = p.split(",")[0].replace("_", " ")
-                if self.glass_info.category_exists(name):
-                    self.content_cats.add(name)
-                    added_cats = added_cats + 1
+                names.append(p.split(",")[0].replace("_", " "))
+        return names
+
+    def get_tentative_cats(self):
+        """Get the categories only added if they exist."""
+        return self.get_tentative_depicted_cats()
+
+    def generate_depicted_cat(self):
+        names = self.get_tentative_depicted_cats()
+        number_of_people = len(names)
+        added_cats = 0
+        for name in names:
+            if self.glass_info.category_exists(name):
+                self.content_cats.add(name)
+                added_cats = added_cats + 1
         if added_cats == 0 or added_cats < number_of_people:
             self.meta_cats.add(BATCH_CAT + ": needing categorisation (people)")
 
@@ -5,16 +5,20 @@ Construct templates and categories for Helleday data.
 """
 from collections import OrderedDict
 import os.path
-from os import listdir
 
-from xml.dom.minidom import parseString
 import pywikibot
 
-import batchupload.listscraper as listscraper
 import batchupload.common as common
 import batchupload.helpers as helpers
 from batchupload.make_info import MakeBaseInfo
+import category_cache
+import derivation
+import dscribe
+import image_index
+import mapping_revisions
+import render_pool
 import utils
+import wd_values
 
 MAPPINGS_DIR = 'mappings'
 IMAGE_DIR = 'Helledays samling'
@@ -44,55 +48,63 @@ class HellInfo(MakeBaseInfo):
         return g
 
     def category_exists(self, cat):
-        if not cat.lower().startswith('category:'):
-            cat = 'Category:{0}'.format(cat)
-
-        if cat in self.category_cache:
-            return cat
-
-        exists = pywikibot.Page(self.commons, cat).exists()
-        if exists:
-            self.category_cache.append(cat)
-        return exists
-
-    def load_wd_value(self, qid, props, cache=None):
-        if cache and qid in cache:
-            return cache[qid]
-
-        data = {}
-        wd_item = pywikibot.ItemPage(self.wikidata, qid)
-        wd_item.exists()  # load data
-        for pid, label in props.items():
-            value = None
-            claims = wd_item.claims.get(pid)
-            if claims:
-                value = claims[0].getTarget()
-            data[label] = value
-
-        if cache:
-            cache[qid] = data
-        return data
+        return self.category_cache.exists(cat)
+
+    def load_wd_values(self, qids, props):
+        """Get {label: value} for the props of each qid, in bulk."""
+        return self.wd_values.load(qids, props)
+
+    @classmethod
+    def handle_args(cls, args, *other):
+        """Add -workers:N, to parse and render in that many processes."""
+        workers, args = dscribe.pop_workers_arg(args)
+        options = super(HellInfo, cls).handle_args(args, *other)
+        options['workers'] = workers
+        return options
 
     def __init__(self, **options):
+        self.workers = options.pop('workers', None)
         super(HellInfo, self).__init__(**options)
         self.batch_cat = "{}: {}".format(BATCH_CAT, BATCH_DATE)
         self.commons = pywikibot.Site('commons', 'commons')
         self.wikidata = pywikibot.Site('wikidata', 'wikidata')
         self.log = common.LogFile('', LOGFILE)
-        self.photographer_cache = {}
-        self.category_cache = []
+        self.wd_values = wd_values.WdValueLoader(self.wikidata)
+        self.category_cache = category_cache.CategoryCache(self.commons)
+        self.derivations = derivation.DerivationCache()
 
     def load_data(self, in_file):
-        return common.open_and_read_file(in_file, as_json=False)
+        # the file is streamed record by record in process_data
+        return in_file
+
+    def make_info(self):
+        # look up all tentative categories in batches before they are used
+        self.category_cache.prefetch(
+            cat for item in self.data.values()
+            for cat in item.get_tentative_cats())
+        try:
+            if self.workers and self.workers > 1:
+                return render_pool.render_in_pool(
+                    self, super(HellInfo, self).make_info, self.workers)
+            return super(HellInfo, self).make_info()
+        finally:
+            self.category_cache.save()
+            self.derivations.report()
 
     def generate_content_cats(self, item):
-        item.generate_yearly_cat()
-        item.generate_theatre_cat()
-        item.generate_depicted_cat()
-        item.generate_costume_cat()
-        item.generate_portrait_cat()
-        item.generate_photographer_cat()
-        item.generate_play_cat()
+        # each rule is only run once per distinct value it depends on
+        apply = self.derivations.apply
+        depicted_names = tuple(x["name"] for x in item.depicted)
+        depicted_genders = tuple(x["gender"] for x in item.depicted)
+        apply(item, item.generate_yearly_cat, item.image_date)
+        apply(item, item.generate_theatre_cat, item.ensemble)
+        apply(item, item.generate_depicted_cat, depicted_names)
+        apply(item, item.generate_costume_cat,
+              (item.image_type, "scenkostymer" in item.keywords))
+        apply(item, item.generate_portrait_cat,
+              (item.image_type, depicted_genders))
+        apply(item, item.generate_photographer_cat, item.creator)
+        apply(item, item.generate_play_cat, item.show_title)
         return [x for x in list(item.content_cats) if x is not None]
 
     def generate_filename(self, item):
@@ -109,11 +121,9 @@ class HellInfo(MakeBaseInfo):
 
     def get_original_filename(self, item):
         filename = None
-        path = IMAGE_DIR
-        image_id = item.id_no
-        for fname in listdir(path):
-            if fname.startswith(image_id):
-                filename = fname[:-4]
+        fname = image_index.get_index(IMAGE_DIR).last_match(item.id_no)
+        if fname is not None:
+            filename = fname[:-4]
         return filename
 
     def load_mappings(self, update_mappings):
@@ -129,114 +139,65 @@ class HellInfo(MakeBaseInfo):
 
         if update_mappings:
             print("Updating mappings...")
-            self.mappings['photographers'] = self.get_photographer_mapping(
-                photographer_page)
-            self.mappings['theatres'] = self.get_theatre_mapping(theatre_page)
-            self.mappings['depicted'] = self.get_depicted_mapping(
-                depicted_page)
-            self.mappings['plays'] = self.get_play_mapping(play_page)
+            sources = {
+                'photographers': (photographer_file, photographer_page,
+                                  self.parse_wikidata_rows,
+                                  self.resolve_photographers),
+                'theatres': (theatre_file, theatre_page,
+                             self.parse_category_rows, dict),
+                'depicted': (depicted_file, depicted_page,
+                             self.parse_wikidata_rows,
+                             self.resolve_depicted),
+                'plays': (play_file, play_page,
+                          self.parse_category_rows, dict),
+            }
+            revisions = mapping_revisions.get_latest_revisions(
+                self.commons, [x[1] for x in sources.values()])
+            for key, (filename, page, parse, resolve) in sources.items():
+                self.mappings[key] = mapping_revisions.refresh_mapping(
+                    self.commons, filename, page, revisions.get(page),
+                    parse, resolve)
             self.mappings['helleday_files'] = self.get_existing_helleday_files()
-            common.open_and_write_file(
-                theatre_file, self.mappings['theatres'], as_json=True)
-            common.open_and_write_file(
-                photographer_file, self.mappings['photographers'],
-                as_json=True)
-            common.open_and_write_file(
-                depicted_file, self.mappings['depicted'], as_json=True)
-            common.open_and_write_file(
-                play_file, self.mappings['plays'], as_json=True)
             common.open_and_write_file(
                 helleday_file, self.mappings['helleday_files'], as_json=True)
         else:
-            self.mappings['photographers'] = common.open_and_read_file(
-                photographer_file, as_json=True)
-            self.mappings['theatres'] = common.open_and_read_file(
-                theatre_file, as_json=True)
-            self.mappings['depicted'] = common.open_and_read_file(
-                depicted_file, as_json=True)
-            self.mappings['plays'] = common.open_and_read_file(
-                play_file, as_json=True)
-            self.mappings['helleday_files'] = common.open_and_read_file(
-                helleday_file, as_json=True)
+            self.mappings['photographers'] = utils.load_mapping(
+                photographer_file)
+            self.mappings['theatres'] = utils.load_mapping(theatre_file)
+            self.mappings['depicted'] = utils.load_mapping(depicted_file)
+            self.mappings['plays'] = utils.load_mapping(play_file)
+            self.mappings['helleday_files'] = utils.load_mapping(
+                helleday_file)
 
         pywikibot.output('Loaded all mappings')
 
-    def get_theatre_mapping(self, theatre_page):
-        theatres = {}
-        page = pywikibot.Page(self.commons, theatre_page)
-        data = listscraper.parseEntries(
-            page.text,
-            row_t='User:André Costa (WMSE)/mapping-row',
-            default_params={'name': '', 'category': '', 'frequency': ''})
-        for entry in data:
-            if entry['category'] and entry['name']:
-                category = entry['category'][0]
-                name = entry['name'][0]
-                theatres[name] = category
-        return theatres
-
-    def get_photographer_mapping(self, photographer_page):
-        page = pywikibot.Page(self.commons, photographer_page)
-        data = listscraper.parseEntries(
-            page.text,
-            row_t='User:André Costa (WMSE)/mapping-row',
-            default_params={'name': '', 'wikidata': '', 'frequency': ''})
-
-        # load data on page
-        photographer_ids = {}
-        for entry in data:
-            if entry['wikidata'] and entry['name']:
-                wikidata = entry['wikidata'][0]
-                name = entry['name'][0]
-                if wikidata != '-':
-                    photographer_ids[name] = wikidata
-
-        # look up data on Wikidata
+    def parse_category_rows(self, text):
+        return mapping_revisions.parse_mapping_rows(text, 'category')
+
+    def parse_wikidata_rows(self, text):
+        return mapping_revisions.parse_mapping_rows(
+            text, 'wikidata', skip=('-',))
+
+    def resolve_photographers(self, photographer_ids):
+        """Look up the photographers on Wikidata."""
         photographer_props = {'P373': 'commonscat', 'P1472': 'creator'}
+        values = self.load_wd_values(
+            list(photographer_ids.values()), photographer_props)
         photographers = {}
         for name, qid in photographer_ids.items():
-            photographers[name] = self.load_wd_value(
-                qid, photographer_props, self.photographer_cache)
+            photographers[name] = dict(values[qid])
         return photographers
 
-    def get_play_mapping(self, play_page):
-        theatres = {}
-        page = pywikibot.Page(self.commons, play_page)
-        data = listscraper.parseEntries(
-            page.text,
-            row_t='User:André Costa (WMSE)/mapping-row',
-            default_params={'name': '', 'category': '', 'frequency': ''})
-        for entry in data:
-            if entry['category'] and entry['name']:
-                category = entry['category'][0]
-                name = entry['name'][0]
-                theatres[name] = category
-        return theatres
-
-    def get_depicted_mapping(self, depicted_page):
-        page = pywikibot.Page(self.commons, depicted_page)
-        data = listscraper.parseEntries(
-            page.text,
-            row_t='User:André Costa (WMSE)/mapping-row',
-            default_params={'name': '', 'wikidata': '', 'frequency': ''})
-
-        # load data on page
-        photographer_ids = {}
-        for entry in data:
-            if entry['wikidata'] and entry['name']:
-                wikidata = entry['wikidata'][0]
-                name = entry['name'][0]
-                if wikidata != '-':
-                    photographer_ids[name] = wikidata
-
-        # look up data on Wikidata
-        photographer_props = {'P373': 'commonscat'}
-        photographers = {}
-        for name, qid in photographer_ids.items():
-            photographers[name] = self.load_wd_value(
-                qid, photographer_props, self.photographer_cache)
-            photographers[name]["wikidata"] = qid
-        return photographers
+    def resolve_depicted(self, depicted_ids):
+        """Look up the depicted people on Wikidata."""
+        depicted_props = {'P373': 'commonscat'}
+        values = self.load_wd_values(
+            list(depicted_ids.values()), depicted_props)
+        depicted = {}
+        for name, qid in depicted_ids.items():
+            depicted[name] = dict(values[qid])
+            depicted[name]["wikidata"] = qid
+        return depicted
 
     def get_existing_helleday_files(self):
         existing = {}
@@ -262,10 +223,8 @@ class HellInfo(MakeBaseInfo):
         template_data['other versions'] = item.get_other_versions()
         return helpers.output_block_template(template_name, template_data, 0)
 
-    def process_data(self, raw_data):
+    def process_data(self, in_file):
         d = {}
-        dom = parseString(utils.character_cleanup(raw_data))
-        records = dom.getElementsByTagName("DScribeRecord")
         tagDict = {'description': 'Description',
                    'creator': 'UserWrapped5',
                    'depicted': 'UserText1',
@@ -284,39 +243,32 @@ class HellInfo(MakeBaseInfo):
                    'thumbnail': 'Thumbnail',
                    'url': 'URL',
                    'keywords': 'Keyword'}
-        for record in records:
+        for record in dscribe.iter_record_dicts(in_file, tagDict,
+                                                self.workers):
             rec_dic = {}
             for tag in tagDict:
-                xml_tag = tagDict[tag]
                 try:
                     if tag == 'depicted':
-                        id_tag = tagDict["related_auth"]
-                        gender_tag = tagDict["gender"]
                         content = []
-                        for i, el in enumerate(record.getElementsByTagName(xml_tag)):
+                        for i, name in enumerate(record[tag]):
                             person = {}
-                            person_name = el.firstChild.nodeValue.strip()
-                            person_id = record.getElementsByTagName(
-                                id_tag)[i].firstChild.nodeValue.strip()
-                            person["gender"] = record.getElementsByTagName(
-                                gender_tag)[i].firstChild.nodeValue.strip()
-                            person["name"] = person_name
-                            person["id_no"] = person_id
+                            person["gender"] = record["gender"][i].strip()
+                            person["name"] = name.strip()
+                            person["id_no"] = record["related_auth"][i].strip()
                             content.append(person)
                     else:
-                        content = record.getElementsByTagName(
-                            xml_tag)[0].firstChild.nodeValue.strip()
+                        content = dscribe.first_text(record[tag])
                 except (AttributeError, IndexError):
                     content = ""
                 rec_dic[tag] = content
             id_no = rec_dic["id_no"]
             d[id_no] = HellItem(rec_dic, self)
 
-        path = IMAGE_DIR
-        for fname in listdir(path):
-            img_code = "_".join(fname.split("_")[:2])
-            if img_code not in [x for x in d]:
-                print("File exists, no xml entry:", fname)
+        index = image_index.get_index(IMAGE_DIR)
+        image_index.report_unmatched(
+            index.names, lambda fname: "_".join(fname.split("_")[:2]), d,
+            lambda item: index.last_match(item.id_no) is not None)
+        utils.add_std_dates(d.values())
         self.data = d
 
 
@@ -367,13 +319,19 @@ class HellItem(object):
                     self.content_cats.add(
                         depicted_map[person_name].get('commonscat'))
 
-    def generate_yearly_cat(self):
+    def get_tentative_cats(self):
+        """Get the categories only added if they exist."""
+        tentative = []
         if self.image_date:
             if "-tal" in self.image_date:
                 year = self.image_date.split("-")[0]
-                tentative_cat = "Theatre in the {}s".format(year)
+                tentative.append("Theatre in the {}s".format(year))
             else:
-                tentative_cat = "{} in theatre".format(self.image_date)
+                tentative.append("{} in theatre".format(self.image_date))
+        return tentative
+
+    def generate_yearly_cat(self):
+        for tentative_cat in self.get_tentative_cats():
             if self.hell_info.category_exists(tentative_cat):
                 self.content_cats.add(tentative_cat)
 
@@ -433,10 +391,7 @@ class HellItem(object):
             self.keywords = []
 
     def generate_date(self):
-        date = None
-        if self.image_date:
-            date = helpers.stdDate(self.image_date)
-        return date
+        return self.std_date
 
     def manually_parse_dimensions(self, dim_string):
         """18,3 x 11,6 cm or 16x25 cm"""
@@ -4,15 +4,18 @@
 Construct templates and categories for Helleday data.
 """
 from collections import OrderedDict
-from os import listdir
 
-from xml.dom.minidom import parseString
 import pywikibot
 
 import batchupload.listscraper as listscraper
 import batchupload.common as common
 import batchupload.helpers as helpers
 from batchupload.make_info import MakeBaseInfo
+import category_cache
+import derivation
+import dscribe
+import image_index
+import render_pool
 import utils
 
 MAPPINGS_DIR = 'mappings'
@@ -25,31 +28,48 @@ LOGFILE = "stereokort.log"
 
 class StereoInfo(MakeBaseInfo):
 
+    @classmethod
+    def handle_args(cls, args, *other):
+        """Add -workers:N, to parse and render in that many processes."""
+        workers, args = dscribe.pop_workers_arg(args)
+        options = super(StereoInfo, cls).handle_args(args, *other)
+        options['workers'] = workers
+        return options
+
     def __init__(self, **options):
+        self.workers = options.pop('workers', None)
         super(StereoInfo, self).__init__(**options)
         self.batch_cat = "{}: {}".format(BATCH_CAT, BATCH_DATE)
         self.commons = pywikibot.Site('commons', 'commons')
         self.wikidata = pywikibot.Site('wikidata', 'wikidata')
         self.log = common.LogFile('', LOGFILE)
-        self.category_cache = []
+        self.category_cache = category_cache.CategoryCache(self.commons)
+        self.derivations = derivation.DerivationCache()
 
     def category_exists(self, cat):
-        if not cat.lower().startswith('category:'):
-            cat = 'Category:{0}'.format(cat)
-
-        if cat in self.category_cache:
-            return cat
-
-        exists = pywikibot.Page(self.commons, cat).exists()
-        if exists:
-            self.category_cache.append(cat)
-        return exists
+        return self.category_cache.exists(cat)
 
     def load_data(self, in_file):
-        return common.open_and_read_file(in_file, as_json=False)
+        # the file is streamed record by record in process_data
+        return in_file
+
+    def make_info(self):
+        # look up all tentative categories in batches before they are used
+        self.category_cache.prefetch(
+            cat for item in self.data.values()
+            for cat in item.get_tentative_cats())
+        try:
+            if self.workers and self.workers > 1:
+                return render_pool.render_in_pool(
+                    self, super(StereoInfo, self).make_info, self.workers)
+            return super(StereoInfo, self).make_info()
+        finally:
+            self.category_cache.save()
+            self.derivations.report()
 
     def generate_content_cats(self, item):
-        item.generate_yearly_cat()
+        self.derivations.apply(item, item.generate_yearly_cat,
+                               item.image_date)
         item.content_cats.add("Color stereo cards")
         item.content_cats.add("Stereo cards in the Swedish Performing Arts Agency")
         return list(item.content_cats)
@@ -86,20 +106,11 @@ class StereoInfo(MakeBaseInfo):
         return helpers.output_block_template(template_name, template_data, 0)
 
     def get_original_filename(self, item):
-        filename = None
-        path = IMAGE_DIR
-        image_id = item.id_no
-        number = item.number
-        for fname in listdir(path):
-            fname = fname.split(".")[0]
-            if fname.split("_")[0] == image_id and fname.endswith(number):
-                filename = fname
-        return filename
+        index = image_index.get_index(IMAGE_DIR, image_index.StereoIndex)
+        return index.get(item.id_no, item.number)
 
-    def process_data(self, raw_data):
+    def process_data(self, in_file):
         d = {}
-        dom = parseString(utils.character_cleanup(raw_data))
-        records = dom.getElementsByTagName("DScribeRecord")
         tagDict = {
             'image_title': 'Title',
             'id_no': 'RefNo',
@@ -114,22 +125,21 @@ class StereoInfo(MakeBaseInfo):
             'record_type': 'RecordType',
             'dimensions': 'DimensionValue'
         }
-        for record in records:
+        for record in dscribe.iter_record_dicts(in_file, tagDict,
+                                                self.workers):
             rec_dic = {}
             for tag in tagDict:
-                xml_tag = tagDict[tag]
                 try:
                     if tag == "description":
                         descriptions = {}
-                        nodes = record.getElementsByTagName(xml_tag)
-                        swedish = nodes[0].firstChild.nodeValue.strip()
-                        english = nodes[1].firstChild.nodeValue.strip()
+                        nodes = record[tag]
+                        swedish = dscribe.first_text(nodes)
+                        english = dscribe.first_text(nodes[1:])
                         descriptions["sv"] = swedish
                         descriptions["en"] = english
                         content = descriptions
                     else:
-                        content = record.getElementsByTagName(
-                            xml_tag)[0].firstChild.nodeValue.strip()
+                        content = dscribe.first_text(record[tag])
                 except (AttributeError, IndexError):
                     content = ""
                 rec_dic[tag] = content
@@ -141,6 +151,12 @@ class StereoInfo(MakeBaseInfo):
                 rec_dic_b["number"] = "b"
                 d[id_no + "a"] = StereoItem(rec_dic_a, self)
                 d[id_no + "b"] = StereoItem(rec_dic_b, self)
+
+        index = image_index.get_index(IMAGE_DIR, image_index.StereoIndex)
+        image_index.report_unmatched(
+            index.names, lambda fname: "".join(index.key(fname)), d,
+            lambda item: index.get(item.id_no, item.number) is not None)
+        utils.add_std_dates(d.values())
         self.data = d
 
 
@@ -171,10 +187,7 @@ class StereoItem(object):
         return "{}\n{}".format(text, template)
 
     def generate_date(self):
-        date = None
-        if self.image_date:
-            date = helpers.stdDate(self.image_date)
-        return date
+        return self.std_date
 
     def generate_license(self):
         return "{{PD-old}}"
@@ -194,14 +207,15 @@ class StereoItem(object):
             parsed = template.format(first, second)
         return parsed
 
-    def generate_yearly_cat(self):
+    def get_tentative_cats(self):
+        """Get the categories only added if they exist."""
         if "talet" in self.image_date:
             year = self.image_date.split("-")[0]
-            tentative_cat = "Theatre in the {}s".format(year)
-            if self.stereo_info.category_exists(tentative_cat):
-                self.content_cats.add(tentative_cat)
-        else:
-            tentative_cat = "{} in theatre".format(self.image_date)
+            return ["Theatre in the {}s".format(year)]
+        return ["{} in theatre".format(self.image_date)]
+
+    def generate_yearly_cat(self):
+        for tentative_cat in self.get_tentative_cats():
             if self.stereo_info.category_exists(tentative_cat):
                 self.content_cats.add(tentative_cat)
 
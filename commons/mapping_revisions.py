@@ -0,0 +1,114 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Incremental refresh of the mapping files built from wiki pages.
+
+Next to each mapping file a <file>.rev sidecar records the revision
+of the source page and the raw rows it was built from. A refresh
+looks up the latest revision of all pages in one query, only fetches
+pages which changed and only resolves rows which are new or changed.
+"""
+import json
+import os
+
+import batchupload.common as common
+import batchupload.listscraper as listscraper
+import pywikibot
+
+ROW_TEMPLATE = 'User:André Costa (WMSE)/mapping-row'
+
+
+def state_file(mapping_file):
+    return "{}.rev".format(mapping_file)
+
+
+def load_state(mapping_file):
+    filename = state_file(mapping_file)
+    if not os.path.exists(filename) or not os.path.exists(mapping_file):
+        return None
+    with open(filename, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(mapping_file, page_title, revid, rows):
+    with open(state_file(mapping_file), 'w', encoding="utf-8") as f:
+        json.dump({"page": page_title, "revid": revid, "rows": rows}, f,
+                  ensure_ascii=False, indent=4)
+
+
+def get_latest_revisions(site, titles):
+    """
+    Get the latest revision id of many pages in one request.
+
+    :return: dict of title -> revision id, missing pages are left out
+    """
+    request = pywikibot.data.api.Request(
+        site=site,
+        parameters={"action": "query", "prop": "revisions",
+                    "rvprop": "ids", "titles": "|".join(titles)})
+    query = request.submit().get("query", {})
+    normalized = {x["to"]: x["from"] for x in query.get("normalized", [])}
+    revisions = {}
+    for page in query.get("pages", {}).values():
+        if "revisions" in page:
+            title = normalized.get(page["title"], page["title"])
+            revisions[title] = page["revisions"][0]["revid"]
+    return revisions
+
+
+def parse_mapping_rows(text, value_param, skip=()):
+    """
+    Get name -> value from the mapping-row templates of a page.
+
+    Rows lacking a name or value, or with a value in skip, are left out.
+    """
+    data = listscraper.parseEntries(
+        text,
+        row_t=ROW_TEMPLATE,
+        default_params={'name': '', value_param: '', 'frequency': ''})
+    rows = {}
+    for entry in data:
+        if entry[value_param] and entry['name']:
+            value = entry[value_param][0]
+            if value not in skip:
+                rows[entry['name'][0]] = value
+    return rows
+
+
+def refresh_mapping(site, mapping_file, page_title, revid, parse, resolve):
+    """
+    Bring a mapping file up to date with its source page.
+
+    :param revid: latest revision of the page, from get_latest_revisions
+    :param parse: function giving the {name: raw value} rows of the
+        page text
+    :param resolve: function giving the {name: mapped value} for some
+        of those rows
+    :return: the mapping
+    """
+    state = load_state(mapping_file)
+    if state and revid is not None and state["revid"] == revid:
+        return common.open_and_read_file(mapping_file, as_json=True)
+
+    page = pywikibot.Page(site, page_title)
+    rows = parse(page.text)
+    old_rows = {}
+    old_mapping = {}
+    if state:
+        old_rows = state["rows"]
+        old_mapping = common.open_and_read_file(mapping_file, as_json=True)
+    changed = {name: raw for name, raw in rows.items()
+               if name not in old_mapping or old_rows.get(name) != raw}
+    resolved = resolve(changed) if changed else {}
+    pywikibot.output("{}: {} of {} rows changed.".format(
+        page_title, len(changed), len(rows)))
+
+    mapping = {}
+    for name in rows:
+        if name in resolved:
+            mapping[name] = resolved[name]
+        elif name not in changed:
+            mapping[name] = old_mapping[name]
+    common.open_and_write_file(mapping_file, mapping, as_json=True)
+    save_state(mapping_file, page_title, page.latest_revision_id, rows)
+    return mapping
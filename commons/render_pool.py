@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Parallel rendering of the info for the items of a MakeBaseInfo.
+
+The workers are forked, so the parsed items, mappings and caches are
+shared copy-on-write. The items are split into chunks in order and the
+output is merged back in the same order, so it is identical to that of
+a serial run.
+
+Whatever a worker changes stays in the worker unless it is sent back,
+so each chunk also returns
+    * the attributes of its items which were set or changed while
+      rendering, e.g. description or meta_cats,
+    * the new entries of the category cache,
+which the parent applies as if it had rendered the chunk itself. The
+changed attributes must be picklable. Workers drop the http connections
+inherited from the parent and open their own.
+"""
+from collections import Counter
+import multiprocessing
+
+from pywikibot.comms import http
+
+CHUNKS_PER_WORKER = 4
+
+render_state = {}
+
+
+def init_worker():
+    # pooled connections are shared with the parent after the fork
+    http.session.close()
+
+
+def item_state(item):
+    """Get the attributes of an item, with containers copied."""
+    return {attr: value.copy() if isinstance(value, (dict, list, set))
+            else value
+            for attr, value in vars(item).items()}
+
+
+def changed_attributes(item, before):
+    return {attr: value for attr, value in vars(item).items()
+            if attr not in before or before[attr] != value}
+
+
+def render_chunk(keys):
+    """Render the items with the given keys, in a worker."""
+    info = render_state["info"]
+    all_data = info.data
+    info.data = type(all_data)((key, all_data[key]) for key in keys)
+    info.derivations.hits = Counter()
+    info.derivations.misses = Counter()
+    cache = getattr(info, "category_cache", None)
+    known_cats = set(cache.entries) if cache else set()
+    before = {key: item_state(all_data[key]) for key in keys}
+    try:
+        output = render_state["render"]()
+    finally:
+        info.data = all_data
+    changes = {key: changed_attributes(all_data[key], before[key])
+               for key in keys}
+    new_cats = {}
+    if cache:
+        new_cats = {title: entry for title, entry in cache.entries.items()
+                    if title not in known_cats}
+    return {"output": output,
+            "changes": changes,
+            "new_cats": new_cats,
+            "hits": info.derivations.hits,
+            "misses": info.derivations.misses}
+
+
+def apply_chunk(info, result):
+    """Apply what a worker did to a chunk to the parent."""
+    for key, changes in result["changes"].items():
+        vars(info.data[key]).update(changes)
+    if result["new_cats"]:
+        info.category_cache.entries.update(result["new_cats"])
+    info.derivations.hits.update(result["hits"])
+    info.derivations.misses.update(result["misses"])
+
+
+def render_in_pool(info, render, workers):
+    """
+    Run render over chunks of info.data in forked worker processes.
+
+    :param info: the MakeBaseInfo instance
+    :param render: function rendering all of info.data, i.e. the
+        make_info of the base class
+    :param workers: number of worker processes
+    :return: the merged output of render
+    """
+    keys = list(info.data)
+    size = max(len(keys) // (workers * CHUNKS_PER_WORKER), 1)
+    chunks = [keys[i:i + size] for i in range(0, len(keys), size)]
+    render_state["info"] = info
+    render_state["render"] = render
+    output = None
+    context = multiprocessing.get_context("fork")
+    try:
+        with context.Pool(workers, initializer=init_worker) as pool:
+            for result in pool.imap(render_chunk, chunks):
+                if output is None:
+                    output = result["output"]
+                else:
+                    output.update(result["output"])
+                apply_chunk(info, result)
+    finally:
+        render_state.clear()
+    if output is None:
+        output = render()
+    return output
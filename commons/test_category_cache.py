@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+
+import pytest
+
+pytest.importorskip("pywikibot")
+
+import category_cache  # noqa: E402
+
+EXISTING = {"Category:A", "Category:C"}
+
+
+class FakeCache(category_cache.CategoryCache):
+    """Answers lookups from EXISTING and remembers the batches asked."""
+
+    def __init__(self, *args, **kwargs):
+        self.batches = []
+        super(FakeCache, self).__init__(None, *args, **kwargs)
+
+    def query(self, titles):
+        self.batches.append(list(titles))
+        self.requests += 1
+        now = time.time()
+        for title in titles:
+            self.entries[title] = [title in EXISTING, now]
+
+
+def test_prefetch_batches_unknown_categories(tmp_path, monkeypatch):
+    monkeypatch.setattr(category_cache, "BATCH_SIZE", 2)
+    cache = FakeCache(str(tmp_path / "cache.json"))
+    cache.prefetch(["A", "Category:B", "C", "a"])
+    assert cache.batches == [["Category:A", "Category:B"],
+                             ["Category:C", "Category:a"]]
+    assert cache.exists("A") and not cache.exists("B")
+    cache.prefetch(["A", "B"])
+    assert len(cache.batches) == 2
+
+
+def test_missing_entries_are_looked_up_one_by_one(tmp_path):
+    cache = FakeCache(str(tmp_path / "cache.json"))
+    assert cache.exists("C")
+    assert cache.exists("Category:C")
+    assert cache.batches == [["Category:C"]]
+
+
+def test_saved_entries_expire(tmp_path):
+    cache_file = str(tmp_path / "cache.json")
+    with open(cache_file, "w") as f:
+        json.dump({"Category:A": [True, time.time()],
+                   "Category:B": [True, time.time() - 100]}, f)
+    cache = FakeCache(cache_file, ttl=50)
+    assert set(cache.entries) == {"Category:A"}
+    assert not cache.exists("B")
+    cache.save()
+    assert set(FakeCache(cache_file).entries) == {"Category:A", "Category:B"}
+
+
+def test_query_reads_normalized_and_missing_pages(tmp_path, monkeypatch):
+    result = {"query": {
+        "normalized": [{"from": "Category:a", "to": "Category:A"}],
+        "pages": {"1": {"title": "Category:A"},
+                  "-1": {"title": "Category:B", "missing": ""}}}}
+
+    class FakeRequest(object):
+
+        def __init__(self, site, parameters):
+            assert parameters["titles"] == "Category:a|Category:B"
+
+        def submit(self):
+            return result
+    monkeypatch.setattr(category_cache.pywikibot.data.api, "Request",
+                        FakeRequest, raising=False)
+    cache = category_cache.CategoryCache(None, str(tmp_path / "cache.json"))
+    cache.query(["Category:a", "Category:B"])
+    assert cache.entries["Category:a"][0] is True
+    assert cache.entries["Category:B"][0] is False
+    assert cache.requests == 1
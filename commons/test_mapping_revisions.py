@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+pytest.importorskip("pywikibot")
+pytest.importorskip("batchupload")
+
+import mapping_revisions  # noqa: E402
+
+
+class FakePage(object):
+    pages = {}
+
+    def __init__(self, site, title):
+        self.text, self.latest_revision_id = self.pages[title]
+
+
+@pytest.fixture
+def wiki(monkeypatch):
+    monkeypatch.setattr(mapping_revisions.pywikibot, "Page", FakePage)
+    return FakePage.pages
+
+
+def parse(text):
+    return dict(line.split("=") for line in text.split())
+
+
+class Resolver(object):
+
+    def __init__(self):
+        self.asked = []
+
+    def __call__(self, rows):
+        self.asked.append(sorted(rows))
+        return {name: raw.upper() for name, raw in rows.items()}
+
+
+def refresh(mapping_file, revid, resolve):
+    return mapping_revisions.refresh_mapping(
+        None, mapping_file, "Mapping", revid, parse, resolve)
+
+
+def test_only_changed_rows_are_resolved(wiki, tmp_path):
+    mapping_file = str(tmp_path / "mapping.json")
+    resolve = Resolver()
+    wiki["Mapping"] = ("a=x b=y c=z", 1)
+    assert refresh(mapping_file, 1, resolve) == {"a": "X", "b": "Y", "c": "Z"}
+
+    wiki["Mapping"] = ("a=x b=w d=v", 2)
+    assert refresh(mapping_file, 2, resolve) == {"a": "X", "b": "W", "d": "V"}
+    assert resolve.asked == [["a", "b", "c"], ["b", "d"]]
+
+
+def test_same_revision_is_not_fetched(wiki, tmp_path):
+    mapping_file = str(tmp_path / "mapping.json")
+    wiki["Mapping"] = ("a=x", 1)
+    refresh(mapping_file, 1, Resolver())
+    del wiki["Mapping"]
+    resolve = Resolver()
+    assert refresh(mapping_file, 1, resolve) == {"a": "X"}
+    assert resolve.asked == []
+
+
+def test_unresolved_rows_are_retried(wiki, tmp_path):
+    mapping_file = str(tmp_path / "mapping.json")
+    wiki["Mapping"] = ("a=x b=y", 1)
+    refresh(mapping_file, 1, lambda rows: {"a": "X"})
+    resolve = Resolver()
+    wiki["Mapping"] = ("a=x b=y", 2)
+    assert refresh(mapping_file, 2, resolve) == {"a": "X", "b": "Y"}
+    assert resolve.asked == [["b"]]
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from collections import Counter, OrderedDict
+import multiprocessing
+
+import pytest
+
+pytest.importorskip("pywikibot.comms.http")
+
+import render_pool  # noqa: E402
+
+if "fork" not in multiprocessing.get_all_start_methods():
+    pytest.skip("needs fork", allow_module_level=True)
+
+
+class Item(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Derivations(object):
+
+    def __init__(self):
+        self.hits = Counter()
+        self.misses = Counter()
+
+
+class Cache(object):
+
+    def __init__(self):
+        self.entries = {"Category:Old": [True, 0]}
+
+
+class Info(object):
+    """Renders like MakeBaseInfo.make_info, changing items on the way."""
+
+    def __init__(self, names):
+        self.data = OrderedDict((name, Item(name)) for name in names)
+        self.derivations = Derivations()
+        self.category_cache = Cache()
+
+    def make_info(self):
+        output = OrderedDict()
+        for key, item in self.data.items():
+            item.description = item.name.upper()
+            self.category_cache.entries["Category:" + key] = [True, 1]
+            self.derivations.hits[key] += 1
+            output[key] = {"info": item.description}
+        return output
+
+
+NAMES = ["d", "b", "e", "a", "c", "f", "g"]
+
+
+@pytest.fixture
+def rendered():
+    info = Info(NAMES)
+    return info, render_pool.render_in_pool(info, info.make_info, 2)
+
+
+def test_output_is_in_serial_order(rendered):
+    info, output = rendered
+    assert output == Info(NAMES).make_info()
+    assert list(output) == NAMES
+
+
+def test_item_changes_reach_the_parent(rendered):
+    info, output = rendered
+    assert [item.description for item in info.data.values()] == \
+        [name.upper() for name in NAMES]
+
+
+def test_cache_entries_and_counts_reach_the_parent(rendered):
+    info, output = rendered
+    assert set(info.category_cache.entries) == \
+        {"Category:" + name for name in NAMES + ["Old"]}
+    assert info.derivations.hits == Counter(NAMES)
+
+
+def test_empty_data_is_rendered_serially():
+    info = Info([])
+    assert render_pool.render_in_pool(info, info.make_info, 2) == {}
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+pytest.importorskip("pywikibot")
+
+import wd_values  # noqa: E402
+
+PROPS = {"P1": "first", "P2": "second"}
+
+
+def string_claim(value):
+    return [{"mainsnak": {"datavalue": {"value": value}}}]
+
+
+class FakeLoader(wd_values.WdValueLoader):
+    """Answers wbgetentities from a dict of qid -> (lastrevid, claims)."""
+
+    def __init__(self, wiki, *args, **kwargs):
+        self.wiki = wiki
+        self.asked = []
+        super(FakeLoader, self).__init__(None, *args, **kwargs)
+
+    def get_entities(self, qids, props):
+        self.asked.append((props, list(qids)))
+        entities = {}
+        for qid in qids:
+            if qid not in self.wiki:
+                entities[qid] = None
+                continue
+            lastrevid, claims = self.wiki[qid]
+            entities[qid] = {"lastrevid": lastrevid}
+            if "claims" in props:
+                entities[qid]["claims"] = claims
+        return entities
+
+
+@pytest.fixture
+def wiki():
+    return {"Q1": (10, {"P1": string_claim("a")}),
+            "Q2": (20, {"P1": string_claim("b"), "P2": string_claim("c")})}
+
+
+def claims_asked(loader):
+    return [qids for props, qids in loader.asked if "claims" in props]
+
+
+def test_values_are_loaded(wiki, tmp_path):
+    loader = FakeLoader(wiki, str(tmp_path / "cache.json"))
+    assert loader.load(["Q2", "Q1", "Q3", "Q1"], PROPS) == {
+        "Q1": {"first": "a", "second": None},
+        "Q2": {"first": "b", "second": "c"},
+        "Q3": {"first": None, "second": None}}
+    assert claims_asked(loader) == [["Q1", "Q2"]]
+
+
+def test_only_edited_items_are_fetched_again(wiki, tmp_path):
+    cache_file = str(tmp_path / "cache.json")
+    FakeLoader(wiki, cache_file).load(["Q1", "Q2"], PROPS)
+    wiki["Q2"] = (21, {"P1": string_claim("d")})
+    loader = FakeLoader(wiki, cache_file)
+    assert loader.load(["Q1", "Q2"], PROPS) == {
+        "Q1": {"first": "a", "second": None},
+        "Q2": {"first": "d", "second": None}}
+    assert claims_asked(loader) == [["Q2"]]
+
+
+def test_new_properties_are_fetched(wiki, tmp_path):
+    loader = FakeLoader(wiki, str(tmp_path / "cache.json"))
+    loader.load(["Q1"], {"P1": "first"})
+    loader.load(["Q1"], PROPS)
+    assert claims_asked(loader) == [["Q1"], ["Q1"]]
+
+
+def test_deleted_items_give_none(wiki, tmp_path):
+    cache_file = str(tmp_path / "cache.json")
+    FakeLoader(wiki, cache_file).load(["Q1"], PROPS)
+    del wiki["Q1"]
+    assert FakeLoader(wiki, cache_file).load(["Q1"], PROPS) == {
+        "Q1": {"first": None, "second": None}}
+
+
+def test_requests_are_batched(wiki, tmp_path, monkeypatch):
+    monkeypatch.setattr(wd_values, "BATCH_SIZE", 1)
+    loader = FakeLoader(wiki, str(tmp_path / "cache.json"))
+    loader.load(["Q1", "Q2"], PROPS)
+    assert sorted(claims_asked(loader)) == [["Q1"], ["Q2"]]
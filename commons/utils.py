@@ -1,25 +1,15 @@
 #!/usr/bin/python
 # -*- coding: utf-8  -*-
+import batchupload.common as common
 import batchupload.helpers as helpers
 
+from shared import bundle
+from shared import dates
+from shared import entities
 
-def character_cleanup(txt):
-    glossary = {
-        "&Aacute;": "Á",
-        "&aacute;": "á",
-        "&Aring;": "Å",
-        "&Auml;": "Ä",
-        "&auml;": "ä",
-        "&apos;": "'",
-        "&eacute;": "é",
-        "&egrave;": "è",
-        "&Egrave;": "È",
-        "&oacute;": "ó",
-        "&uuml;": "ü",
-    }
-    for key in glossary.keys():
-        txt = txt.replace(key, glossary[key])
-    return txt
+# the entity decoding is shared with the other script directory
+character_cleanup = entities.character_cleanup
+CleanupReader = entities.CleanupReader
 
 
 def clean_name(name_string):
@@ -31,3 +21,24 @@ def clean_name(name_string):
     else:
         good_name = helpers.flip_name(name_string.split("(")[0].strip())
     return good_name
+
+
+def load_mapping(filename):
+    """Load a json mapping file, from the compiled bundle if up to date."""
+    compiled = bundle.open_table(filename)
+    if compiled is not None:
+        return compiled
+    return common.open_and_read_file(filename, as_json=True)
+
+
+def add_std_dates(items):
+    """
+    Set std_date of each item to its standardised image_date.
+
+    The dates are standardised as one column, so each distinct date is
+    only parsed once, and before any render workers are forked.
+    """
+    items = list(items)
+    std_dates = dates.std_dates(item.image_date for item in items)
+    for item, std_date in zip(items, std_dates):
+        item.std_date = std_date
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Bulk loading of string property values from Wikidata.
+
+Entities are requested 50 at a time with wbgetentities, a few requests
+in parallel. The values are kept on disk together with the last
+revision of the entity, so that the claims are only fetched again for
+entities edited since the previous run.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+
+import pywikibot
+
+CACHE_FILE = "wd_values.json"
+BATCH_SIZE = 50
+WORKERS = 4
+
+
+def first_value(claims):
+    """Get the value of the first claim, as Claim.getTarget would."""
+    if not claims:
+        return None
+    datavalue = claims[0]["mainsnak"].get("datavalue")
+    return datavalue["value"] if datavalue else None
+
+
+class WdValueLoader(object):
+
+    def __init__(self, site, cache_file=CACHE_FILE, workers=WORKERS):
+        self.site = site
+        self.cache_file = cache_file
+        self.workers = workers
+        self.entries = {}  # qid -> {"lastrevid": int, "values": {pid: value}}
+        if os.path.exists(self.cache_file):
+            with open(self.cache_file, encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def save(self):
+        with open(self.cache_file, 'w', encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+
+    def get_entities(self, qids, props):
+        """
+        Run wbgetentities for a batch of ids.
+
+        :return: dict of requested qid -> entity json, None if missing
+        """
+        request = pywikibot.data.api.Request(
+            site=self.site,
+            parameters={"action": "wbgetentities", "ids": "|".join(qids),
+                        "props": props})
+        entities = {}
+        for qid, entity in request.submit().get("entities", {}).items():
+            if "redirects" in entity:
+                qid = entity["redirects"]["from"]
+            entities[qid] = None if "missing" in entity else entity
+        return entities
+
+    def map_batches(self, qids, props):
+        batches = [qids[i:i + BATCH_SIZE]
+                   for i in range(0, len(qids), BATCH_SIZE)]
+        entities = {}
+        with ThreadPoolExecutor(self.workers) as executor:
+            for result in executor.map(
+                    lambda batch: self.get_entities(batch, props), batches):
+                entities.update(result)
+        return entities
+
+    def is_current(self, qid, lastrevid, pids):
+        entry = self.entries.get(qid)
+        return (entry is not None and entry["lastrevid"] == lastrevid and
+                all(pid in entry["values"] for pid in pids))
+
+    def load(self, qids, props):
+        """
+        Get the values of some string properties for many items.
+
+        :param qids: list of item ids
+        :param props: dict of pid -> label
+        :return: dict of qid -> {label: value or None}
+        """
+        qids = sorted(set(qids))
+        revisions = self.map_batches(qids, "info")
+        stale = [qid for qid in qids
+                 if revisions.get(qid) is not None and
+                 not self.is_current(qid, revisions[qid]["lastrevid"],
+                                     props)]
+        if stale:
+            pywikibot.output("Fetching claims of {} of {} items.".format(
+                len(stale), len(qids)))
+        for qid, entity in self.map_batches(stale, "info|claims").items():
+            if entity is None:
+                continue
+            self.entries[qid] = {
+                "lastrevid": entity["lastrevid"],
+                "values": {pid: first_value(entity["claims"].get(pid))
+                           for pid in props}}
+        self.save()
+
+        data = {}
+        for qid in qids:
+            entry = self.entries.get(qid) if revisions.get(qid) else None
+            data[qid] = {label: entry["values"][pid] if entry else None
+                         for pid, label in props.items()}
+        return data
@@ -0,0 +1,2 @@
+# auth/shared and commons/shared link to shared, collect its tests once
+collect_ignore = ["auth/shared", "commons/shared"]
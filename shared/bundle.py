@@ -0,0 +1,281 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Compiled, memory mapped version of the json mapping files.
+
+All json files in a mappings directory are compiled into one
+mappings.bundle file: a string table followed by one open addressing
+hash table per mapping file. QIDs are stored as integers. The bundle
+is opened with mmap and values are only decoded when looked up, so
+opening it costs next to nothing, in every process. Values which are
+not strings are stored as json and decoded once per bundle.
+
+Used by both auth and commons, from the shared directory.
+
+Usage, from auth or commons: python -m shared.bundle --mappings_dir mappings
+"""
+from collections.abc import Mapping
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import zlib
+
+from shared import labels
+
+BUNDLE_NAME = "mappings.bundle"
+MAGIC = b"SMVMAP01"
+HEADER = struct.Struct("<8sI")
+# key offset, key length, kind, value a, value b
+SLOT = struct.Struct("<IIBxxxII")
+EMPTY = 0xFFFFFFFF
+
+KIND_QID = 1  # value a: numeric QID
+KIND_LABEL = 2  # value a: numeric QID, value b: number of matches
+KIND_STR = 3  # value a: offset, value b: length
+KIND_JSON = 4  # value a: offset, value b: length
+
+QID_PATTERN = re.compile("^Q[0-9]+$")
+
+bundle_cache = {}
+
+
+def is_label_list(content):
+    """Check if a json file is a WDQS result of items and their labels."""
+    return isinstance(content, list) and all(
+        isinstance(x, dict) and "item" in x and "itemLabel" in x
+        for x in content)
+
+
+class StringTable(object):
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = {}
+
+    def add(self, text):
+        raw = text.encode("utf-8")
+        if raw not in self.offsets:
+            self.offsets[raw] = len(self.data)
+            self.data += raw
+        return self.offsets[raw], len(raw)
+
+
+def encode_value(strings, value):
+    """Get (kind, value a, value b) for a mapping value."""
+    if isinstance(value, tuple):
+        qid, count = value
+        return KIND_LABEL, int(qid[1:]), count
+    elif isinstance(value, str) and QID_PATTERN.match(value) and \
+            int(value[1:]) < EMPTY:
+        return KIND_QID, int(value[1:]), 0
+    elif isinstance(value, str):
+        return (KIND_STR,) + strings.add(value)
+    return (KIND_JSON,) + strings.add(
+        json.dumps(value, ensure_ascii=False, sort_keys=True))
+
+
+def make_table(strings, mapping):
+    """Build the slots of the hash table for one mapping."""
+    capacity = 8
+    while capacity < len(mapping) * 2:
+        capacity *= 2
+    slots = [None] * capacity
+    for key, value in mapping.items():
+        raw_key = key.encode("utf-8")
+        position = zlib.crc32(raw_key) & (capacity - 1)
+        while slots[position] is not None:
+            position = (position + 1) & (capacity - 1)
+        slots[position] = strings.add(key) + encode_value(strings, value)
+    table = bytearray()
+    for slot in slots:
+        table += SLOT.pack(*(slot or (EMPTY, 0, 0, 0, 0)))
+    return table, capacity
+
+
+def compile_bundle(mappings_dir):
+    """Compile all json files of a directory into one bundle."""
+    strings = StringTable()
+    tables = []
+    directory = {"tables": {}}
+    for filename in sorted(os.listdir(mappings_dir)):
+        if not filename.endswith(".json"):
+            continue
+        path = os.path.join(mappings_dir, filename)
+        with open(path, encoding="utf-8") as f:
+            content = json.load(f)
+        if is_label_list(content):
+            content = labels.make_label_index(content)
+        elif not isinstance(content, dict):
+            print("Skipping {}, not a mapping.".format(filename))
+            continue
+        table, capacity = make_table(strings, content)
+        name = filename[:-len(".json")]
+        stat = os.stat(path)
+        directory["tables"][name] = {
+            "capacity": capacity,
+            "size": len(content),
+            "source_mtime": stat.st_mtime,
+            "source_size": stat.st_size}
+        tables.append((name, table))
+
+    # offsets are counted from the end of the directory
+    position = len(strings.data)
+    for name, table in tables:
+        directory["tables"][name]["offset"] = position
+        position += len(table)
+    raw_directory = json.dumps(directory).encode("utf-8")
+
+    out_file = os.path.join(mappings_dir, BUNDLE_NAME)
+    with open(out_file, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(raw_directory)))
+        f.write(raw_directory)
+        f.write(strings.data)
+        for _, table in tables:
+            f.write(table)
+    print("Compiled {} mappings into {}.".format(len(tables), out_file))
+
+
+class Bundle(object):
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, directory_size = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not a mapping bundle.".format(filename))
+        self.data_offset = HEADER.size + directory_size
+        self.directory = json.loads(
+            self.mm[HEADER.size:self.data_offset].decode("utf-8"))
+        # offset -> decoded json value, shared by all lookups
+        # so the values must not be changed by the caller
+        self.json_values = {}
+
+    def table(self, name):
+        return BundleTable(self, name)
+
+    def is_current(self, name, source):
+        """Check that a table was compiled from the current source file."""
+        info = self.directory["tables"].get(name)
+        if info is None or not os.path.exists(source):
+            return False
+        stat = os.stat(source)
+        return (info["source_mtime"] == stat.st_mtime and
+                info["source_size"] == stat.st_size)
+
+    def get_string(self, offset, length):
+        start = self.data_offset + offset
+        return self.mm[start:start + length].decode("utf-8")
+
+    def get_json(self, offset, length):
+        value = self.json_values.get(offset)
+        if value is None:
+            value = json.loads(self.get_string(offset, length))
+            self.json_values[offset] = value
+        return value
+
+
+class BundleTable(Mapping):
+    """Read-only dict view of one compiled mapping."""
+
+    def __init__(self, bundle, name):
+        self.bundle = bundle
+        self.name = name
+        info = bundle.directory["tables"][name]
+        self.offset = bundle.data_offset + info["offset"]
+        self.capacity = info["capacity"]
+        self.size = info["size"]
+
+    def __getstate__(self):
+        # reopen the file instead of pickling the mapped memory
+        return (self.bundle.filename, self.name)
+
+    def __setstate__(self, state):
+        filename, name = state
+        self.__init__(get_bundle(filename), name)
+
+    def get_slot(self, position):
+        return SLOT.unpack_from(self.bundle.mm,
+                                self.offset + position * SLOT.size)
+
+    def decode_value(self, kind, value_a, value_b):
+        if kind == KIND_QID:
+            return "Q{}".format(value_a)
+        elif kind == KIND_LABEL:
+            return ("Q{}".format(value_a), value_b)
+        elif kind == KIND_JSON:
+            return self.bundle.get_json(value_a, value_b)
+        return self.bundle.get_string(value_a, value_b)
+
+    def find_slot(self, key):
+        """Find the slot of a key, None if it is not in the table."""
+        raw_key = key.encode("utf-8")
+        mm = self.bundle.mm
+        data_offset = self.bundle.data_offset
+        position = zlib.crc32(raw_key) & (self.capacity - 1)
+        while True:
+            slot = self.get_slot(position)
+            key_offset, key_length = slot[:2]
+            if key_offset == EMPTY:
+                return None
+            start = data_offset + key_offset
+            if key_length == len(raw_key) and \
+                    mm[start:start + key_length] == raw_key:
+                return slot
+            position = (position + 1) & (self.capacity - 1)
+
+    def __getitem__(self, key):
+        if not isinstance(key, str):
+            raise KeyError(key)
+        slot = self.find_slot(key)
+        if slot is None:
+            raise KeyError(key)
+        return self.decode_value(*slot[2:])
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self.find_slot(key) is not None
+
+    def __iter__(self):
+        for position in range(self.capacity):
+            key_offset, key_length = self.get_slot(position)[:2]
+            if key_offset != EMPTY:
+                yield self.bundle.get_string(key_offset, key_length)
+
+    def __len__(self):
+        return self.size
+
+
+def get_bundle(filename):
+    bundle = bundle_cache.get(filename)
+    if bundle is None:
+        bundle = Bundle(filename)
+        bundle_cache[filename] = bundle
+    return bundle
+
+
+def open_table(json_file):
+    """
+    Get the compiled version of a json mapping file, if up to date.
+
+    :param json_file: path of the json file, the bundle is looked for
+        in the same directory
+    :return: BundleTable, or None if there is no current compiled version
+    """
+    bundle_file = os.path.join(os.path.dirname(json_file), BUNDLE_NAME)
+    if not os.path.exists(bundle_file):
+        return None
+    bundle = get_bundle(bundle_file)
+    name = os.path.splitext(os.path.basename(json_file))[0]
+    if not bundle.is_current(name, json_file):
+        return None
+    return bundle.table(name)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mappings_dir", default="mappings")
+    args = parser.parse_args()
+    compile_bundle(args.mappings_dir)
@@ -0,0 +1,181 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Normalisation of the date strings found in the CalmView exports.
+
+All patterns are compiled once and every function is memoised, since
+the same few thousand date strings come back over and over again.
+The memo holds frozen results and every call gets a new dict, so a
+caller changing its result does not change it for anyone else.
+Used by both auth and commons, from the shared directory.
+
+normalise_date gives one of these results, depending on the form:
+    a point in time, as precise as the string
+        "1850-03-02", "1850-3-2", "född 1850-03-02", "död 1901-01-01"
+            -> {"year": 1850, "month": 3, "day": 2}
+        "1850-03" -> {"year": 1850, "month": 3}
+        "1850" -> {"year": 1850}
+    a decade
+        "1890-talet", "1890-tal" -> {"decade": 1890}
+    a range of years
+        "1850-1901", "?-1901"
+            -> {"start": {"year": 1850} or None, "end": {"year": 1901}}
+    None, for anything else, including months and days out of range
+Callers wanting a point in time should check for "year".
+"""
+from functools import lru_cache, wraps
+import calendar
+import datetime
+import re
+
+import batchupload.helpers as helpers
+
+CACHE_SIZE = 65536
+
+PATTERN_DAY = re.compile(
+    r"^(?:född |död )?([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})$")
+PATTERN_MONTH = re.compile(r"^([0-9]{4})-([0-9]{1,2})$")
+PATTERN_YEAR = re.compile(r"^([0-9]{4})$")
+PATTERN_DECADE = re.compile(r"^([0-9]{3}0)-tal(?:et)?$")
+PATTERN_RANGE = re.compile(r"^([0-9]{4}|\?)\s*-\s*([0-9]{4}|\?)$")
+PATTERN_BORN = re.compile("född ([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})")
+PATTERN_DEAD = re.compile("död ([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})")
+
+
+def freeze(value):
+    """Get an immutable version of a, possibly nested, result dict."""
+    if isinstance(value, dict):
+        return tuple((key, freeze(x)) for key, x in value.items())
+    return value
+
+
+def thaw(value):
+    """Get a new dict from a result frozen by freeze."""
+    if isinstance(value, tuple):
+        return {key: thaw(x) for key, x in value}
+    return value
+
+
+def memoised(func):
+    """Memoise a function returning a dict, handing out new copies."""
+    cached = lru_cache(maxsize=CACHE_SIZE)(lambda *args: freeze(func(*args)))
+
+    @wraps(func)
+    def wrapper(*args):
+        return thaw(cached(*args))
+    wrapper.cache_info = cached.cache_info
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+
+def is_valid_date(year, month, day=None):
+    if not 1 <= month <= 12:
+        return False
+    return day is None or 1 <= day <= calendar.monthrange(year, month)[1]
+
+
+@memoised
+def normalise_date(raw):
+    """Normalise a single date string, see the module docstring."""
+    raw = raw.strip().lower()
+    match = PATTERN_DAY.match(raw)
+    if match:
+        year, month, day = (int(x) for x in match.groups())
+        if is_valid_date(year, month, day):
+            return {"year": year, "month": month, "day": day}
+        return None
+    match = PATTERN_MONTH.match(raw)
+    if match:
+        year, month = (int(x) for x in match.groups())
+        if is_valid_date(year, month):
+            return {"year": year, "month": month}
+        return None
+    match = PATTERN_YEAR.match(raw)
+    if match:
+        return {"year": int(match.group(1))}
+    match = PATTERN_DECADE.match(raw)
+    if match:
+        return {"decade": int(match.group(1))}
+    match = PATTERN_RANGE.match(raw)
+    if match:
+        start, end = (None if x == "?" else {"year": int(x)}
+                      for x in match.groups())
+        return {"start": start, "end": end}
+
+
+@memoised
+def date_to_dict(datestring, dateformat):
+    """
+    Memoised strptime based conversion to a pwb-friendly dictionary.
+
+    This is the only implementation, importer_utils.date_to_dict
+    calls it.
+    """
+    date_dict = {}
+    date_obj = datetime.datetime.strptime(datestring, dateformat)
+    date_dict["year"] = date_obj.year
+    if "%m" in dateformat:
+        date_dict["month"] = date_obj.month
+    if "%d" in dateformat:
+        date_dict["day"] = date_obj.day
+    return date_dict
+
+
+@memoised
+def parse_lifespan(dates, dates_places):
+    """
+    Get birth and death from the Dates and DatesAndPlaces fields.
+
+    Dates holds e.g. "1850-1901" or "?-1901" and DatesAndPlaces may
+    hold exact dates, "född 1850-03-02 ... död 1901-01-01", which
+    take precedence unless they are not valid dates.
+
+    :return: dict with "birth" and/or "death" strings
+    """
+    lifespan = {}
+    if "-" not in dates:
+        return lifespan
+    birth = dates.split("-")[0].strip()
+    death = dates.split("-")[1].strip()
+    if "?" not in birth:
+        lifespan["birth"] = birth
+    if "?" not in death:
+        lifespan["death"] = death
+    raw = dates_places.lower()
+    born = PATTERN_BORN.search(raw)
+    if born and padded_date(born):
+        lifespan["birth"] = helpers.isoDate(padded_date(born))
+    dead = PATTERN_DEAD.search(raw)
+    if dead and padded_date(dead):
+        lifespan["death"] = helpers.isoDate(padded_date(dead))
+    return lifespan
+
+
+def padded_date(match):
+    """
+    Get "1850-03-02" from a year, month, day match of "1850-3-2".
+
+    :return: the date, None if it is not a valid date
+    """
+    year, month, day = (int(x) for x in match.groups())
+    if not is_valid_date(year, month, day):
+        return None
+    return "{:04d}-{:02d}-{:02d}".format(year, month, day)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def std_date(raw):
+    """Memoised batchupload.helpers.stdDate."""
+    return helpers.stdDate(raw)
+
+
+def std_dates(column):
+    """
+    Run std_date over a whole column, parsing each distinct value once.
+
+    :param column: iterable of raw date strings, empty ones give None
+    :return: list of results, in the same order
+    """
+    column = list(column)
+    results = {raw: std_date(raw) for raw in set(column) if raw}
+    return [results.get(raw) for raw in column]
@@ -0,0 +1,62 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Decoding of the html entities in the CalmView exports.
+
+Used by both auth and commons, from the shared directory.
+"""
+from html.entities import html5
+from xml.sax.saxutils import escape
+import re
+
+XML_ENTITIES = ("amp", "lt", "gt", "quot")
+ENTITY_PATTERN = re.compile(
+    "&(?!(?:{});)([A-Za-z][A-Za-z0-9]*);".format("|".join(XML_ENTITIES)))
+
+
+def decode_entity(match):
+    """
+    Get the character of an html entity, leave unknown ones alone.
+
+    Characters with a meaning in xml, e.g. from &LT;, are escaped again.
+    """
+    value = html5.get(match.group(1) + ";")
+    if value is None:
+        return match.group(0)
+    return escape(value, {'"': "&quot;"})
+
+
+def character_cleanup(txt):
+    """
+    Replace the html entities of the CalmView exports in one pass.
+
+    The entities xml itself knows (&amp; &lt; &gt; &quot;) are kept,
+    as are numeric ones.
+    """
+    return ENTITY_PATTERN.sub(decode_entity, txt)
+
+
+class CleanupReader(object):
+    """
+    File-like wrapper running character_cleanup over a text stream.
+
+    Anything after the last '&' of a chunk is held back until the
+    next read, so that an entity split across two chunks is still
+    replaced.
+    """
+
+    def __init__(self, f_obj):
+        self.f_obj = f_obj
+        self.pending = ""
+
+    def read(self, size=-1):
+        data = self.f_obj.read(size)
+        chunk = self.pending + data
+        self.pending = ""
+        if data and size is not None and size > 0:
+            cut = chunk.rfind("&")
+            if cut != -1 and ";" not in chunk[cut:]:
+                chunk, self.pending = chunk[:cut], chunk[cut:]
+                if not chunk:
+                    return self.read(size)
+        return character_cleanup(chunk)
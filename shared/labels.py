@@ -0,0 +1,29 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Label indexes of WDQS results.
+
+Used by both the mapping bundle and auth, from the shared directory.
+"""
+
+
+def make_label_index(entries, label_key="itemLabel", item_key="item"):
+    """
+    Build a label -> (QID, number of matches) index from a WDQS result.
+
+    The count tells how many entries share the label, so that
+    ambiguous labels can be told apart from unique ones.
+
+    :param entries: list of dicts, e.g. from a mapping file
+    :param label_key: key holding the label
+    :param item_key: key holding the entity url or QID
+    """
+    index = {}
+    for entry in entries or []:
+        label = entry[label_key]
+        qid = entry[item_key].split("/")[-1]
+        if label in index:
+            index[label] = (index[label][0], index[label][1] + 1)
+        else:
+            index[label] = (qid, 1)
+    return index
@@ -0,0 +1,135 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Streaming and parallel parsing of large DScribe (CalmView) xml exports.
+
+iter_records streams the records of a file one at a time. For
+parallel parsing the file is split into byte ranges at record start tags, so that every
+range holds whole records only. Each range is wrapped in a dummy root
+element, parsed in a worker process and the results are merged in
+file order. Used by both auth and commons, from the shared directory.
+"""
+from multiprocessing import Pool
+from xml.etree.ElementTree import iterparse
+import codecs
+import mmap
+import os
+
+RECORD_TAG = "DScribeRecord"
+SHARDS_PER_WORKER = 4
+SHARD_ROOT = "Shard"
+
+
+def iter_records(source, record_tag=RECORD_TAG):
+    """
+    Stream the record elements of a DScribe export.
+
+    Each record is detached from its parent once the caller is done
+    with it, so memory use does not grow with the size of the file.
+
+    :param source: file-like object yielding the cleaned up xml
+    :param record_tag: name of the record element
+    """
+    stack = []
+    for event, elem in iterparse(source, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+        stack.pop()
+        if elem.tag == record_tag:
+            yield elem
+            if stack:
+                stack[-1].remove(elem)
+            elem.clear()
+
+
+def find_shards(filename, count, record_tag=RECORD_TAG):
+    """
+    Split a file into at most count byte ranges of whole records.
+
+    Records are expected to be siblings, as in the CalmView exports,
+    and a record start tag inside a comment or CDATA section would be
+    taken for a real one.
+
+    :return: list of (start, end) byte offsets
+    """
+    start_tag = "<{}".format(record_tag).encode("utf-8")
+    end_tag = "</{}>".format(record_tag).encode("utf-8")
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            def next_record(position):
+                while True:
+                    position = mm.find(start_tag, position)
+                    if position == -1:
+                        return -1
+                    following = mm[position + len(start_tag):
+                                   position + len(start_tag) + 1]
+                    if following in (b">", b"/", b" ", b"\t", b"\r", b"\n"):
+                        return position
+                    position += len(start_tag)
+
+            first = next_record(0)
+            last = mm.rfind(end_tag)
+            if first == -1 or last == -1:
+                return []
+            last += len(end_tag)
+            step = max((last - first) // max(count, 1), 1)
+            starts = [first]
+            for i in range(1, count):
+                position = next_record(first + i * step)
+                if position == -1 or position >= last:
+                    break
+                if position > starts[-1]:
+                    starts.append(position)
+        finally:
+            mm.close()
+    return list(zip(starts, starts[1:] + [last]))
+
+
+class ShardReader(object):
+    """File-like text view of one byte range, inside a dummy root."""
+
+    def __init__(self, f_obj, start, end):
+        self.f_obj = f_obj
+        self.f_obj.seek(start)
+        self.remaining = end - start
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.head = "<{}>".format(SHARD_ROOT)
+        self.tail = "</{}>".format(SHARD_ROOT)
+
+    def read(self, size=-1):
+        text, self.head = self.head, ""
+        if size is None or size < 0:
+            size = self.remaining
+        raw = self.f_obj.read(min(size, self.remaining))
+        self.remaining -= len(raw)
+        final = not raw or self.remaining == 0
+        text += self.decoder.decode(raw, final)
+        if final:
+            text, self.tail = text + self.tail, ""
+        return text
+
+
+def parse_shards(filename, parse_shard, workers, *args):
+    """
+    Parse a file in parallel and yield the results in file order.
+
+    :param parse_shard: module level function taking
+        (filename, start, end, *args) and returning a list
+    :param workers: number of worker processes
+    """
+    shards = find_shards(filename, workers * SHARDS_PER_WORKER)
+    jobs = [(filename, start, end) + args for start, end in shards]
+    with Pool(workers) as pool:
+        for results in pool.imap(call_parse_shard,
+                                 [(parse_shard, job) for job in jobs]):
+            for result in results:
+                yield result
+
+
+def call_parse_shard(task):
+    parse_shard, job = task
+    return parse_shard(*job)
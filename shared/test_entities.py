@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import io
+
+from shared import entities
+
+
+def read_all(reader, size):
+    parts = []
+    while True:
+        chunk = reader.read(size)
+        if not chunk:
+            return "".join(parts)
+        parts.append(chunk)
+
+
+def test_character_cleanup():
+    text = "&Aring;sa &auml;r &amp; &lt;b&gt; &#229; &LT; &nosuch;"
+    assert entities.character_cleanup(text) == \
+        "Åsa är &amp; &lt;b&gt; &#229; &lt; &nosuch;"
+
+
+def test_entity_split_across_chunks():
+    text = "<a>Bj&ouml;rk &Aring;sa &amp; &eacute;</a>"
+    expected = entities.character_cleanup(text)
+    for size in range(1, len(text) + 1):
+        reader = entities.CleanupReader(io.StringIO(text))
+        assert read_all(reader, size) == expected, size
+
+
+def test_unterminated_ampersand_is_kept():
+    reader = entities.CleanupReader(io.StringIO("A & B &auml"))
+    assert read_all(reader, 3) == "A & B &auml"
+
+
+def test_read_everything():
+    reader = entities.CleanupReader(io.StringIO("&Auml;"))
+    assert reader.read() == "Ä"
+    assert reader.read() == ""